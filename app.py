@@ -1,16 +1,31 @@
+import sqlite3
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from src import queries
+from datetime import datetime, timedelta
+from src import figures, instrument, queries
+from src.analytics import snapshot_status, start_background_refresher
 from src.db import initialize_database
+from src.expiry import start_background_sweeper
+
+# pandas and plotly are imported inside the pages that use them, so a
+# new session reaches the login page without loading either.
 
 # =========================================================
 # SAFE DATABASE INIT (RUN ONCE)
 # =========================================================
 if "db_initialized" not in st.session_state:
     initialize_database()
+    start_background_sweeper()
+    start_background_refresher()
     st.session_state.db_initialized = True
 
+# Trend chart ranges in days (None = all history).
+TREND_RANGES = {
+    "Last 48 hours": 2,
+    "Last 30 days": 30,
+    "Last 12 months": 365,
+    "All time": None,
+}
+
 # =========================================================
 # PAGE CONFIG
 # =========================================================
@@ -88,7 +103,8 @@ if st.session_state.user is None:
             if user:
                 st.session_state.user = {
                     "user_id": user[0],
-                    "username": user[1]
+                    "username": user[1],
+                    "role": user[2]
                 }
                 st.success("Login successful")
                 st.rerun()
@@ -135,9 +151,13 @@ if st.session_state.mode == "home":
     </div>
     """, unsafe_allow_html=True)
 
-    total_food = queries.total_food_available()
-    food_types = queries.most_common_food_types()
-    claim_status = queries.claim_status_percentage()
+    # One read transaction: the cards and charts always agree. Every
+    # query in it is cached, so fanning them out across threads gains
+    # nothing here.
+    snapshot = queries.dashboard_snapshot()
+    total_food = snapshot.total_food
+    food_types = snapshot.food_types
+    claim_status = snapshot.claim_status
 
     c1, c2, c3 = st.columns(3)
     c1.metric("🍱 Total Food Available", total_food)
@@ -148,68 +168,28 @@ if st.session_state.mode == "home":
     col1, col2 = st.columns(2)
 
     if food_types:
-        df_food = pd.DataFrame(food_types, columns=["Food Type", "Count"])
-        col1.plotly_chart(
-            px.bar(
-                df_food,
-                x="Food Type",
-                y="Count",
-                color="Food Type",
-                color_discrete_sequence=px.colors.qualitative.Set2,
-                title="Food Type Distribution"
-            ),
-            use_container_width=True
-        )
+        col1.plotly_chart(figures.food_types_chart(food_types), use_container_width=True)
 
     if claim_status:
-        df_claim = pd.DataFrame(claim_status, columns=["Status", "Percentage"])
-        col2.plotly_chart(
-            px.pie(
-                df_claim,
-                names="Status",
-                values="Percentage",
-                color="Status",
-                color_discrete_map={
-                    "Completed": "#22c55e",
-                    "Pending": "#facc15",
-                    "Cancelled": "#ef4444"
-                },
-                title="Claim Status Distribution"
-            ),
-            use_container_width=True
-        )
+        col2.plotly_chart(figures.claim_status_chart(claim_status), use_container_width=True)
 
     col3, col4 = st.columns(2)
 
-    top_recv = queries.top_receivers_by_claims()
+    top_recv = snapshot.top_receivers
     if top_recv:
-        df_top = pd.DataFrame(top_recv, columns=["Receiver", "Claims"])
-        col3.plotly_chart(
-            px.bar(
-                df_top,
-                x="Receiver",
-                y="Claims",
-                color_discrete_sequence=["#2563eb"],
-                title="Top Receivers"
-            ),
-            use_container_width=True
-        )
-
-    trend = queries.claims_over_time()
-    if trend:
-        df_trend = pd.DataFrame(trend, columns=["Date", "Claims"])
-        col4.plotly_chart(
-            px.line(
-                df_trend,
-                x="Date",
-                y="Claims",
-                markers=True,
-                line_shape="spline",
-                color_discrete_sequence=["#0ea5e9"],
-                title="Claims Over Time"
-            ),
-            use_container_width=True
-        )
+        col3.plotly_chart(figures.top_receivers_chart(top_recv), use_container_width=True)
+
+    trend_range = col4.selectbox(
+        "Trend range", list(TREND_RANGES), index=list(TREND_RANGES).index("All time")
+    )
+    days = TREND_RANGES[trend_range]
+    # Hour-aligned start so reruns within the hour hit the query cache.
+    since = datetime.now().replace(minute=0, second=0, microsecond=0)
+    trend = queries.claims_timeseries(
+        start=since - timedelta(days=days) if days else None
+    )
+    if trend.points:
+        col4.plotly_chart(figures.claims_trend_chart(trend), use_container_width=True)
 
     a1, a2 = st.columns(2)
     if a1.button("🍱 Provide Food"):
@@ -218,6 +198,9 @@ if st.session_state.mode == "home":
     if a2.button("🤝 Receive Food"):
         st.session_state.mode = "receiver"
         st.rerun()
+    if st.session_state.user.get("role") == "admin" and st.button("🛠 Query Stats"):
+        st.session_state.mode = "admin"
+        st.rerun()
 
 # =========================================================
 # PROVIDER MODE
@@ -230,8 +213,8 @@ elif st.session_state.mode == "provider":
     expiry = st.date_input("Expiry Date")
     city = st.text_input("City")
 
-    food_type = st.selectbox("Food Type", ["Vegetarian", "Non-Vegetarian", "Vegan"])
-    meal_type = st.selectbox("Meal Type", ["Breakfast", "Lunch", "Dinner", "Snacks"])
+    food_type = st.selectbox("Food Type", queries.FOOD_TYPES)
+    meal_type = st.selectbox("Meal Type", queries.MEAL_TYPES)
 
     if st.button("Submit Food"):
         if not food_name or not city:
@@ -246,6 +229,28 @@ elif st.session_state.mode == "provider":
             st.session_state.mode = "home"
             st.rerun()
 
+    st.markdown("### 📤 Bulk Upload")
+    st.caption("CSV columns: " + ", ".join(queries.BULK_LISTING_COLUMNS))
+    upload = st.file_uploader("Upload listings CSV", type="csv")
+    if upload is not None and st.button("Upload Listings"):
+        try:
+            result = queries.create_food_listings_bulk(
+                upload, st.session_state.user["user_id"], "Individual"
+            )
+        except (ValueError, sqlite3.Error) as e:
+            st.error(str(e))
+        else:
+            if result.inserted:
+                st.success(f"{result.inserted} listing(s) added")
+            if result.errors:
+                import pandas as pd
+
+                st.warning(f"{len(result.errors)} row(s) skipped")
+                st.dataframe(
+                    pd.DataFrame(result.errors, columns=["Row", "Error"]),
+                    use_container_width=True
+                )
+
     if st.button("⬅ Back to Home"):
         st.session_state.mode = "home"
         st.rerun()
@@ -254,6 +259,8 @@ elif st.session_state.mode == "provider":
 # RECEIVER MODE
 # =========================================================
 elif st.session_state.mode == "receiver":
+    import pandas as pd
+
     st.markdown("### 👤 Receiver Profile")
 
     receiver = queries.get_receiver_by_user(st.session_state.user["user_id"])
@@ -276,7 +283,26 @@ elif st.session_state.mode == "receiver":
 
     st.markdown("### 📍 Available Food Near You")
 
-    food = queries.get_food_by_city(city)
+    f1, f2, f3 = st.columns(3)
+    food_type_filter = f1.selectbox("Food Type", ["All"] + queries.FOOD_TYPES)
+    meal_type_filter = f2.selectbox("Meal Type", ["All"] + queries.MEAL_TYPES)
+    min_qty = f3.number_input("Min Quantity", min_value=1, value=1)
+
+    # Keyset pagination: keep the cursor of every page visited so far,
+    # reset whenever the city or filters change.
+    filters = (city, food_type_filter, meal_type_filter, min_qty)
+    if st.session_state.get("food_page_filters") != filters:
+        st.session_state.food_page_filters = filters
+        st.session_state.food_page_cursors = [None]
+
+    food, next_cursor = queries.get_food_by_city_page(
+        city,
+        after=st.session_state.food_page_cursors[-1],
+        food_type=None if food_type_filter == "All" else food_type_filter,
+        meal_type=None if meal_type_filter == "All" else meal_type_filter,
+        min_quantity=int(min_qty)
+    )
+
     if not food:
         st.info("No food available in your city")
     else:
@@ -286,15 +312,159 @@ elif st.session_state.mode == "receiver":
         ])
         st.dataframe(df, use_container_width=True)
 
+        p1, p2, p3 = st.columns([1, 1, 4])
+        page_no = len(st.session_state.food_page_cursors)
+        p3.caption(f"Page {page_no}")
+        if page_no > 1 and p1.button("⬅ Previous"):
+            st.session_state.food_page_cursors.pop()
+            st.rerun()
+        if next_cursor is not None and p2.button("Next ➡"):
+            st.session_state.food_page_cursors.append(next_cursor)
+            st.rerun()
+
         ids = df[df["Qty"] > 0]["Food ID"].tolist()
         if ids:
             fid = st.selectbox("Select Food ID to Claim", ids)
+            max_units = int(df.loc[df["Food ID"] == fid, "Qty"].iloc[0])
+            units = st.number_input("Units", min_value=1, max_value=max_units, value=1)
             if st.button("Claim Food"):
-                queries.create_claim(fid, receiver[0])
-                st.success("Food claimed successfully")
-                st.session_state.mode = "home"
-                st.rerun()
+                result = queries.create_claim(fid, receiver[0], int(units))
+                if result.ok:
+                    st.success(f"Claimed {result.units} unit(s) successfully")
+                    st.session_state.mode = "home"
+                    st.rerun()
+                else:
+                    st.error(result.message)
+
+            with st.expander("🧺 Claim Multiple Items"):
+                picked = st.multiselect("Select Food IDs", ids)
+                per_item = st.number_input("Units per item", min_value=1, value=1)
+                all_or_nothing = st.checkbox("Only claim if every item is available", value=True)
+                if picked and st.button("Claim Selected"):
+                    batch = queries.create_claims_batch(
+                        receiver[0],
+                        [(food_id, int(per_item)) for food_id in picked],
+                        queries.ALL_OR_NOTHING if all_or_nothing else queries.BEST_EFFORT
+                    )
+                    if batch.ok:
+                        st.success(f"Claimed {batch.claimed_units} unit(s) across {len(picked)} items")
+                        st.session_state.mode = "home"
+                        st.rerun()
+                    else:
+                        st.dataframe(pd.DataFrame(
+                            [(item.food_id, item.units, item.status, item.message) for item in batch.items],
+                            columns=["Food ID", "Units", "Status", "Message"]
+                        ), use_container_width=True)
+
+    st.markdown("### 🔎 Search Food or Providers")
+    search_text = st.text_input("Search", placeholder="e.g. bread, rice, provider name")
+    only_my_city = st.checkbox("Only in my city", value=False)
+    if search_text:
+        hits = queries.search_food(search_text, city if only_my_city else None)
+        if not hits:
+            st.info("No matching food found")
+        else:
+            st.dataframe(pd.DataFrame(hits, columns=[
+                "Food ID", "Food", "Qty", "Expiry",
+                "Provider ID", "City", "Food Type", "Meal Type"
+            ]), use_container_width=True)
+
+    st.markdown("### 🧭 Food in Nearby Towns")
+    radius = st.slider("Search radius (km)", min_value=5, max_value=200, value=25, step=5)
+    nearby = queries.get_food_near(city, radius)
+    if not nearby:
+        st.info("No food available within this radius")
+    else:
+        st.dataframe(pd.DataFrame(nearby, columns=[
+            "Food ID", "Food", "Qty", "Expiry",
+            "Provider ID", "City", "Food Type", "Meal Type", "Distance (km)"
+        ]), use_container_width=True)
 
     if st.button("⬅ Back to Home"):
         st.session_state.mode = "home"
         st.rerun()
+
+# =========================================================
+# ADMIN: QUERY STATS
+# =========================================================
+elif st.session_state.mode == "admin":
+    import pandas as pd
+
+    st.markdown("### 🛠 Query Stats")
+
+    if st.session_state.user.get("role") != "admin":
+        st.error("Admins only")
+        st.stop()
+
+    s1, s2 = st.columns(2)
+    recording = s1.checkbox("Record query stats", value=instrument.is_enabled())
+    slow_ms = s2.number_input(
+        "Slow query threshold (ms)", min_value=1.0,
+        value=float(instrument.snapshot()["slow_query_ms"]), step=50.0
+    )
+    if recording:
+        instrument.enable(slow_ms)
+    elif instrument.is_enabled():
+        instrument.disable()
+
+    stats = instrument.snapshot()
+    cache = queries.query_cache_stats()
+    acquire = stats["pool_acquire"]
+
+    figure_cache = figures.figure_cache_stats()
+
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("⏱ Pool acquire p95 (ms)", f"{acquire['p95_ms']:.2f}")
+    m2.metric("🧠 Query cache hits", cache["hits"])
+    m3.metric("📈 Figure cache hits", figure_cache["hits"])
+    m4.metric("🐢 Slow queries logged", len(stats["slow_queries"]))
+
+    analytics = snapshot_status()
+    if analytics["exists"]:
+        st.caption(
+            f"📸 Analytics snapshot refreshed {analytics['age_seconds'] / 60:.1f} min ago "
+            f"(every {analytics['refresh_interval'] / 60:.0f} min), "
+            f"EDA queries served from: {analytics['serving']}"
+        )
+    else:
+        st.caption("📸 No analytics snapshot yet, EDA queries use the live database")
+
+    if stats["functions"]:
+        df_stats = pd.DataFrame([
+            {
+                "Function": name,
+                "Calls": f["count"],
+                "p50 ms": f["p50_ms"],
+                "p95 ms": f["p95_ms"],
+                "p99 ms": f["p99_ms"],
+                "Max ms": f["max_ms"],
+                "Total ms": f["total_ms"],
+                "Rows": f["rows"],
+                "Acquire ms": f["acquire_ms"],
+                "Errors": f["errors"],
+            }
+            for name, f in stats["functions"].items()
+        ]).sort_values("Total ms", ascending=False)
+        st.dataframe(df_stats, use_container_width=True, hide_index=True)
+    else:
+        st.info("No queries recorded yet")
+
+    for entry in reversed(stats["slow_queries"]):
+        with st.expander(f"🐢 {entry['function']} — {entry['ms']:.1f} ms at {entry['at']}"):
+            if not entry["statements"]:
+                st.caption("SQL not logged for this function")
+            for statement in entry["statements"]:
+                st.code(statement["sql"], language="sql")
+                st.code("\n".join(statement["plan"]))
+
+    b1, b2, b3 = st.columns(3)
+    b1.download_button(
+        "⬇ Download JSON", instrument.dump_json(),
+        file_name="query_stats.json", mime="application/json"
+    )
+    if b2.button("♻ Reset Stats"):
+        instrument.reset()
+        st.rerun()
+    if b3.button("⬅ Back to Home"):
+        st.session_state.mode = "home"
+        st.rerun()
@@ -0,0 +1,119 @@
+"""
+benchmarks/claim_contention.py
+------------------------------
+Hammers queries.claim_food() from many threads against a scratch
+database and checks that no listing is ever over-allocated.
+
+    python -m benchmarks.claim_contention --threads 32 --listings 50 --quantity 40
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from src import db, queries
+
+
+def _seed(listings, quantity, receivers):
+    conn = db.get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO receivers (receiver_id, name, city, contact) VALUES (?, ?, ?, ?)",
+            [(i, f"Receiver {i}", "Bench City", "000") for i in range(1, receivers + 1)]
+        )
+        conn.executemany("""
+            INSERT INTO food_listings
+            (food_id, food_name, quantity, expiry_date, provider_id,
+             provider_type, location, food_type, meal_type)
+            VALUES (?, ?, ?, '2030-01-01', NULL, 'Bench', 'Bench City', 'Vegan', 'Lunch')
+        """, [(i, f"Food {i}", quantity) for i in range(1, listings + 1)])
+    conn.close()
+
+
+def run(threads=32, listings=50, quantity=40, max_units=3, receivers=100, seed=7):
+    workdir = tempfile.mkdtemp(prefix="claim_bench_")
+    db.set_database_path(os.path.join(workdir, "bench.db"))
+    db.configure_pool(size=threads)
+    db.initialize_database()
+    _seed(listings, quantity, receivers)
+
+    outcomes = Counter()
+    attempts = Counter()
+    lock = threading.Lock()
+    start_gate = threading.Barrier(threads)
+
+    def claimer(worker):
+        rng = random.Random(seed + worker)
+        open_ids = list(range(1, listings + 1))
+        local, local_attempts = Counter(), Counter()
+        start_gate.wait()
+        while open_ids:
+            food_id = rng.choice(open_ids)
+            result = queries.claim_food(
+                food_id, rng.randint(1, receivers), rng.randint(1, max_units)
+            )
+            local[result.status] += 1
+            local_attempts[result.attempts] += 1
+            if result.status == queries.NOT_FOUND or result.remaining == 0:
+                open_ids.remove(food_id)
+        with lock:
+            outcomes.update(local)
+            attempts.update(local_attempts)
+
+    workers = [threading.Thread(target=claimer, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    conn = db.get_connection()
+    over_allocated = conn.execute("""
+        SELECT f.food_id, f.quantity, COALESCE(SUM(c.units), 0)
+        FROM food_listings f
+        LEFT JOIN claims c ON c.food_id = f.food_id
+        GROUP BY f.food_id
+        HAVING f.quantity < 0 OR f.quantity + COALESCE(SUM(c.units), 0) != ?
+    """, (quantity,)).fetchall()
+    claimed_units = conn.execute("SELECT COALESCE(SUM(units), 0) FROM claims").fetchone()[0]
+    conn.close()
+    db.close_pool()
+
+    report = {
+        "threads": threads,
+        "seconds": elapsed,
+        "claims": outcomes[queries.CLAIMED],
+        "claims_per_sec": outcomes[queries.CLAIMED] / elapsed,
+        "attempts_per_sec": sum(outcomes.values()) / elapsed,
+        "outcomes": dict(outcomes),
+        "retries": sum(n * (a - 1) for a, n in attempts.items()),
+        "claimed_units": claimed_units,
+        "available_units": listings * quantity,
+        "over_allocated_listings": len(over_allocated),
+    }
+
+    print(f"🧪 {threads} claimers, {listings} listings x {quantity} units")
+    print(f"   {report['claims']:,} claims in {elapsed:.2f}s "
+          f"({report['claims_per_sec']:,.0f} claims/s, "
+          f"{report['attempts_per_sec']:,.0f} attempts/s)")
+    print(f"   outcomes: {report['outcomes']}, busy retries: {report['retries']}")
+    print(f"   units claimed {claimed_units:,} / {listings * quantity:,}, "
+          f"over-allocated listings: {len(over_allocated)}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent claim contention benchmark")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--listings", type=int, default=50)
+    parser.add_argument("--quantity", type=int, default=40)
+    parser.add_argument("--max-units", type=int, default=3)
+    args = parser.parse_args()
+
+    result = run(args.threads, args.listings, args.quantity, args.max_units)
+    raise SystemExit(1 if result["over_allocated_listings"] else 0)
@@ -0,0 +1,494 @@
+"""
+benchmarks/run.py
+-----------------
+Times every public function in src/queries.py, the load_data loaders
+and the write paths against a synthetic database, and saves the
+results as JSON so two runs can be diffed.
+
+    python -m benchmarks.run --listings 100000 --out results.json
+    python -m benchmarks.run --listings 100000 --compare results.json
+
+Read queries are timed uncached (through __wrapped__) and, separately,
+as cache hits. Exits 1 when --compare finds a regression or a loader
+regression check fails.
+"""
+
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+from src import db, load_data, queries
+
+DEFAULT_REPEAT = 50
+REGRESSION_THRESHOLD = 0.20
+BULK_UPLOAD_ROWS = 100
+BATCH_CLAIM_ITEMS = 5
+
+# Not query paths: decorator, the plan checker's own plumbing and the
+# trend charts' resolution helper.
+NOT_BENCHMARKED = {"cached_query", "pick_resolution"}
+
+
+# =========================================================
+# TIMING
+# =========================================================
+
+def _summarize(samples, rows=None):
+    samples = np.asarray(samples)
+    total = samples.sum()
+    result = {
+        "calls": int(len(samples)),
+        "p50_ms": float(np.percentile(samples, 50) * 1000),
+        "p95_ms": float(np.percentile(samples, 95) * 1000),
+        "mean_ms": float(samples.mean() * 1000),
+        "ops_per_sec": float(len(samples) / total) if total > 0 else float("inf"),
+    }
+    if rows is not None:
+        result["rows"] = rows
+    return result
+
+
+def _time_calls(call_args):
+    """
+    call_args: iterable of zero-arg callables. Returns (samples, last result).
+    """
+    samples, result = [], None
+    for call in call_args:
+        started = time.perf_counter()
+        result = call()
+        samples.append(time.perf_counter() - started)
+    return samples, result
+
+
+def _row_count(result):
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], list):
+        return len(result[0])  # paged (rows, next_cursor)
+    if isinstance(result, list):
+        return len(result)
+    return None
+
+
+# =========================================================
+# WORKLOAD
+# =========================================================
+
+def _sample_arguments(rng):
+    conn = db.get_connection()
+    try:
+        cities = [row[0] for row in conn.execute("""
+            SELECT location, COUNT(*) AS n FROM food_listings
+            GROUP BY location ORDER BY n DESC
+        """)]
+        food_ids = [row[0] for row in conn.execute(
+            "SELECT food_id FROM food_listings WHERE quantity > 0"
+        )]
+        receiver_ids = [row[0] for row in conn.execute("SELECT receiver_id FROM receivers")]
+        provider = conn.execute(
+            "SELECT provider_id, type, city FROM providers LIMIT 1"
+        ).fetchone()
+    finally:
+        conn.close()
+
+    return {
+        "big_city": cities[0],
+        "tail_city": cities[-1],
+        "cities": cities,
+        "food_ids": food_ids,
+        "receiver_ids": receiver_ids,
+        "provider": provider,
+        "rng": rng,
+    }
+
+
+def _read_calls(sample):
+    big, tail = sample["big_city"], sample["tail_city"]
+    return [
+        ("get_food_by_city", queries.get_food_by_city, (big,)),
+        ("get_food_by_city[tail]", queries.get_food_by_city, (tail,)),
+        ("get_available_food", queries.get_available_food, ()),
+        ("get_food_by_city_page", queries.get_food_by_city_page, (big,)),
+        ("get_food_by_city_page[filtered]", queries.get_food_by_city_page, (big,),
+         {"food_type": "Vegan", "meal_type": "Lunch", "min_quantity": 10}),
+        ("get_available_food_page", queries.get_available_food_page, ()),
+        ("get_food_near", queries.get_food_near, (big,)),
+        ("search_food", queries.search_food, ("bread",)),
+        ("search_food[typo]", queries.search_food, ("braed",)),
+        ("search_food[city]", queries.search_food, ("rice",), {"city": big}),
+        ("total_food_available", queries.total_food_available, ()),
+        ("most_common_food_types", queries.most_common_food_types, ()),
+        ("claim_status_percentage", queries.claim_status_percentage, ()),
+        ("top_receivers_by_claims", queries.top_receivers_by_claims, ()),
+        ("top_providers_by_donation", queries.top_providers_by_donation, ()),
+        ("food_by_city", queries.food_by_city, ()),
+        ("claims_over_time", queries.claims_over_time, ()),
+        ("claims_timeseries", queries.claims_timeseries, ()),
+        ("claims_timeseries[status]", queries.claims_timeseries, (),
+         {"status": "Completed"}),
+        ("listings_timeseries", queries.listings_timeseries, ()),
+        ("dashboard_snapshot", queries.dashboard_snapshot, ()),
+        ("data_version", queries.data_version, ()),
+        ("query_cache_stats", queries.query_cache_stats, ()),
+    ]
+
+
+def _bench_reads(sample, repeat, results):
+    for name, func, args, *rest in _read_calls(sample):
+        kwargs = rest[0] if rest else {}
+        uncached = getattr(func, "__wrapped__", func)
+        samples, result = _time_calls(
+            lambda: uncached(*args, **kwargs) for _ in range(repeat)
+        )
+        results[name] = _summarize(samples, _row_count(result))
+
+        if uncached is not func:
+            func(*args, **kwargs)  # warm the cache
+            samples, _ = _time_calls(lambda: func(*args, **kwargs) for _ in range(repeat))
+            results[f"{name}[cached]"] = _summarize(samples)
+
+
+def _bench_users(repeat, results):
+    tag = int(time.time() * 1000)
+    names = [f"bench_{tag}_{i}" for i in range(repeat)]
+
+    samples, _ = _time_calls(
+        (lambda n=n: queries.create_user(n, "secret", "receiver")) for n in names
+    )
+    results["create_user"] = _summarize(samples)
+
+    samples, user = _time_calls(
+        (lambda n=n: queries.authenticate_user(n, "secret")) for n in names
+    )
+    results["authenticate_user"] = _summarize(samples)
+
+    user_ids = [queries.authenticate_user(n, "secret")[0] for n in names]
+    samples, _ = _time_calls(
+        (lambda u=u: queries.create_receiver(u, f"Bench {u}", "Bench City", "000"))
+        for u in user_ids
+    )
+    results["create_receiver"] = _summarize(samples)
+
+    samples, receivers = [], []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        receivers.append(queries.get_receiver_by_user(user_id))
+        samples.append(time.perf_counter() - started)
+    results["get_receiver_by_user"] = _summarize(samples)
+
+    samples, _ = _time_calls(
+        (lambda r=r: queries.update_receiver(r[0], r[1], "Bench Town", "111"))
+        for r in receivers
+    )
+    results["update_receiver"] = _summarize(samples)
+
+
+def _bench_listings(sample, repeat, results):
+    provider_id, provider_type, city = sample["provider"]
+    expiry = date.today() + timedelta(days=7)
+
+    samples, _ = _time_calls(
+        (lambda: queries.create_food_listing(
+            "Bench Bread", 10, expiry, provider_id, provider_type,
+            city, "Vegan", "Lunch",
+        )) for _ in range(repeat)
+    )
+    results["create_food_listing"] = _summarize(samples)
+
+    upload = pd.DataFrame({
+        "food_name": [f"Bench Item {i}" for i in range(BULK_UPLOAD_ROWS)],
+        "quantity": 5,
+        "expiry_date": expiry.isoformat(),
+        "location": city,
+        "food_type": "Vegetarian",
+        "meal_type": "Dinner",
+    })
+    runs = max(1, repeat // 10)
+    samples, _ = _time_calls(
+        (lambda: queries.create_food_listings_bulk(upload, provider_id, provider_type))
+        for _ in range(runs)
+    )
+    results["create_food_listings_bulk"] = _summarize(samples, BULK_UPLOAD_ROWS)
+
+
+def _bench_claims(sample, repeat, results):
+    rng = sample["rng"]
+    food_ids, receiver_ids = sample["food_ids"], sample["receiver_ids"]
+
+    def pick():
+        return rng.choice(food_ids), rng.choice(receiver_ids)
+
+    samples, _ = _time_calls(
+        (lambda f=f, r=r: queries.claim_food(f, r, 1))
+        for f, r in (pick() for _ in range(repeat))
+    )
+    results["claim_food"] = _summarize(samples)
+
+    samples, _ = _time_calls(
+        (lambda f=f, r=r: queries.create_claim(f, r, 1))
+        for f, r in (pick() for _ in range(repeat))
+    )
+    results["create_claim"] = _summarize(samples)
+
+    def batch():
+        return [(rng.choice(food_ids), 1) for _ in range(BATCH_CLAIM_ITEMS)]
+
+    samples, _ = _time_calls(
+        (lambda r=r, items=items: queries.create_claims_batch(r, items, queries.BEST_EFFORT))
+        for r, items in ((rng.choice(receiver_ids), batch()) for _ in range(repeat))
+    )
+    results["create_claims_batch"] = _summarize(samples, BATCH_CLAIM_ITEMS)
+
+    samples, _ = _time_calls(
+        (lambda items=items: queries.create_claims_bulk(items, queries.BEST_EFFORT))
+        for items in (
+            [(rng.choice(receiver_ids), f, 1) for f, _ in batch()] for _ in range(repeat)
+        )
+    )
+    results["create_claims_bulk"] = _summarize(samples, BATCH_CLAIM_ITEMS)
+
+    samples, _ = _time_calls(
+        (lambda: queries.run_write_transaction(lambda cursor: (None, True)))
+        for _ in range(repeat)
+    )
+    results["run_write_transaction"] = _summarize(samples)
+
+    samples, _ = _time_calls(queries.bump_data_version for _ in range(repeat))
+    results["bump_data_version"] = _summarize(samples)
+
+
+def _bench_loaders(paths, results):
+    loaders = [
+        ("load_providers", load_data.load_providers, paths["providers"]),
+        ("load_receivers", load_data.load_receivers, paths["receivers"]),
+        ("load_food_listings", load_data.load_food_listings, paths["food_listings"]),
+        ("load_claims", load_data.load_claims, paths["claims"]),
+        ("load_gazetteer", load_data.load_gazetteer, paths["city_gazetteer"]),
+    ]
+    # First pass is the full load; the second is an unchanged re-run.
+    for suffix in ("", "[rerun]"):
+        for name, loader, path in loaders:
+            stats = loader(path)
+            results[f"load_data.{name}{suffix}"] = {
+                "calls": 1,
+                "mode": stats["mode"],
+                "rows": stats["rows"],
+                "seconds": stats["seconds"],
+                "rows_per_sec": stats["rows_per_sec"],
+            }
+
+
+def _bench_trends(results):
+    # Folds the freshly loaded rows into the rollups, as the background
+    # sweeper would, so the time-series reads have data.
+    started = time.perf_counter()
+    folded = queries.refresh_trends()
+    seconds = time.perf_counter() - started
+    results["refresh_trends"] = {
+        "calls": 1,
+        "mode": "backfill",
+        "rows": folded,
+        "seconds": seconds,
+        "rows_per_sec": folded / seconds if seconds > 0 else float("inf"),
+    }
+
+
+def _check_derived_data():
+    """
+    Regression check: loads that skip the per-row triggers leave the
+    summaries and FTS indexes matching the base tables, and the
+    triggers in place. Returns failure messages.
+    """
+    failures = []
+    conn = db.get_connection()
+    for table in db.verify_summaries(conn):
+        failures.append(f"{table} out of sync after load")
+    for table, fts in db.FTS_INDEXES.items():
+        if not conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?",
+            (table,)
+        ).fetchone()[0]:
+            failures.append(f"{table} triggers missing after load")
+        try:
+            conn.execute(f"INSERT INTO {fts} ({fts}, rank) VALUES ('integrity-check', 1)")
+        except sqlite3.DatabaseError as e:
+            failures.append(f"{fts} does not match {table}: {e}")
+    conn.close()
+    return failures
+
+
+def _check_partial_tail(workdir):
+    """
+    Regression check: the last line of a CSV that is still being
+    written is left alone until it is complete. Returns failure messages.
+    """
+    path = os.path.join(workdir, "partial_providers.csv")
+    conn = db.get_connection()
+    first = conn.execute("SELECT IFNULL(MAX(provider_id), 0) + 1 FROM providers").fetchone()[0]
+    conn.close()
+
+    with open(path, "w") as f:
+        f.write("Provider_ID,Name,Type,Address,City,Contact\n"
+                f"{first},Whole,Restaurant,1 Main St,Bench City,000\n"
+                f"{first + 1},Half")
+    load_data.load_providers(path)
+    query = "SELECT name, type FROM providers WHERE provider_id IN (?, ?) ORDER BY provider_id"
+    conn = db.get_connection()
+    partial = conn.execute(query, (first, first + 1)).fetchall()
+
+    with open(path, "a") as f:
+        f.write(",Restaurant,2 Main St,Bench City,000\n")
+    load_data.load_providers(path)
+    completed = conn.execute(query, (first, first + 1)).fetchall()
+    conn.close()
+
+    failures = []
+    if partial != [("Whole", "Restaurant")]:
+        failures.append(f"unterminated last line was ingested: {partial}")
+    if completed != [("Whole", "Restaurant"), ("Half", "Restaurant")]:
+        failures.append(f"completed line was not picked up on the next run: {completed}")
+    return failures
+
+
+def _not_benchmarked(results):
+    covered = {name.split("[")[0] for name in results}
+    return sorted(
+        name for name, obj in vars(queries).items()
+        if inspect.isfunction(obj)
+        and not name.startswith("_")
+        and obj.__module__ == queries.__name__
+        and name not in covered
+        and name not in NOT_BENCHMARKED
+    )
+
+
+# =========================================================
+# RUNNER
+# =========================================================
+
+def run(listings=10_000, repeat=DEFAULT_REPEAT, seed=42, workdir=None):
+    """
+    Generates a synthetic dataset, loads it and times everything.
+    Returns {"meta": {...}, "results": {name: stats}}.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="query_bench_")
+    paths = synthetic.generate(os.path.join(workdir, "csv"), listings, seed)
+    db.set_database_path(os.path.join(workdir, "bench.db"))
+    db.initialize_database()
+
+    results = {}
+    _bench_loaders(paths, results)
+    loader_failures = _check_derived_data() + _check_partial_tail(workdir)
+    _bench_trends(results)
+
+    sample = _sample_arguments(random.Random(seed))
+    _bench_reads(sample, repeat, results)
+    _bench_users(repeat, results)
+    _bench_listings(sample, repeat, results)
+    _bench_claims(sample, repeat, results)
+
+    started = time.perf_counter()
+    failures = queries.check_query_plans()
+    results["check_query_plans"] = _summarize([time.perf_counter() - started])
+    db.close_pool()
+
+    return {
+        "meta": {
+            "listings": listings,
+            "repeat": repeat,
+            "seed": seed,
+            "date": date.today().isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "full_scans": sorted(failures),
+            "loader_failures": loader_failures,
+            "not_benchmarked": _not_benchmarked(results),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Returns [(name, metric, old, new, change)] for every timing that
+    got slower by more than threshold (0.2 = 20%).
+    """
+    regressions = []
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        for metric in ("p50_ms", "p95_ms", "seconds"):
+            if metric in old and metric in new and old[metric] > 0:
+                change = (new[metric] - old[metric]) / old[metric]
+                if change > threshold:
+                    regressions.append((name, metric, old[metric], new[metric], change))
+    return regressions
+
+
+def print_report(report, baseline=None):
+    meta = report["meta"]
+    print(f"📊 {meta['listings']:,} listings, {meta['repeat']} calls per function, "
+          f"SQLite {meta['sqlite']}")
+    old_results = baseline["results"] if baseline else {}
+
+    for name, stats in report["results"].items():
+        if "p50_ms" in stats:
+            line = (f"   {name:<40} p50 {stats['p50_ms']:9.3f} ms   "
+                    f"p95 {stats['p95_ms']:9.3f} ms   {stats['ops_per_sec']:>10,.0f} ops/s")
+            old = old_results.get(name, {}).get("p50_ms")
+        else:
+            line = (f"   {name:<40} {stats['seconds']:9.3f} s ({stats['mode']})   "
+                    f"{stats['rows_per_sec']:>12,.0f} rows/s")
+            old = old_results.get(name, {}).get("seconds")
+        new = stats.get("p50_ms", stats.get("seconds"))
+        if old:
+            line += f"   {(new - old) / old:+.0%}"
+        print(line)
+
+    if meta["full_scans"]:
+        print(f"⚠️ Full table scans in: {', '.join(meta['full_scans'])}")
+    for failure in meta["loader_failures"]:
+        print(f"❌ Loader: {failure}")
+    if meta["not_benchmarked"]:
+        print(f"⚠️ Not benchmarked: {', '.join(meta['not_benchmarked'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every query and loader")
+    parser.add_argument("--listings", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    report = run(args.listings, args.repeat, args.seed)
+    print_report(report, baseline)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results saved to {args.out}")
+
+    regressions = []
+    if baseline:
+        regressions = compare(baseline, report, args.threshold)
+        for name, metric, old, new, change in regressions:
+            print(f"❌ {name} {metric}: {old:.3f} → {new:.3f} ({change:+.0%})")
+    raise SystemExit(1 if regressions or report["meta"]["loader_failures"] else 0)
@@ -0,0 +1,158 @@
+"""
+benchmarks/startup.py
+---------------------
+Measures how long a cold process takes to get to the login page:
+importing what app.py imports and running the database init, each
+sample in a fresh interpreter against an already-migrated database.
+
+    python -m benchmarks.startup --repeat 10 --out startup.json
+
+Two start-up paths are timed side by side:
+
+    eager  the old start-up path: pandas and plotly imported up front,
+           five connections running CREATE TABLE IF NOT EXISTS, then
+           the migration check, repeated for every new session
+    lazy   the current app.py: heavy imports deferred to the pages
+           that use them and one schema-version check per process
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from src import db
+
+DEFAULT_REPEAT = 10
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "plotly")
+
+# Runs in the child interpreter: argv = [mode, database path].
+_CHILD = r"""
+import json, sys, time
+
+started = time.perf_counter()
+mode, path = sys.argv[1:]
+try:
+    import streamlit
+except ImportError:
+    pass
+if mode == "eager":
+    for name in ("pandas", "plotly.express"):
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+from src import figures, instrument, queries
+from src.analytics import snapshot_status, start_background_refresher
+from src.expiry import start_background_sweeper
+from src import db
+imported = time.perf_counter()
+
+def legacy_init():
+    db.create_users_table()
+    db.create_providers_table()
+    db.create_receivers_table()
+    db.create_food_listings_table()
+    db.create_claims_table()
+    db.run_migrations()
+
+init = legacy_init if mode == "eager" else db.initialize_database
+db.set_database_path(path)
+init()
+ready = time.perf_counter()
+init()  # the next session in the same process
+rerun = time.perf_counter()
+
+print(json.dumps({
+    "imports_ms": (imported - started) * 1000,
+    "init_ms": (ready - imported) * 1000,
+    "total_ms": (ready - started) * 1000,
+    "rerun_init_ms": (rerun - ready) * 1000,
+    "streamlit": "streamlit" in sys.modules,
+    "loaded": sorted(m for m in %r if m in sys.modules),
+}))
+""" % (HEAVY_MODULES,)
+
+
+def _sample(mode, path):
+    output = subprocess.run(
+        [sys.executable, "-c", _CHILD, mode, path],
+        cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _summarize(samples):
+    result = {}
+    for key in ("imports_ms", "init_ms", "rerun_init_ms", "total_ms"):
+        values = [s[key] for s in samples]
+        result[key] = {
+            "p50": statistics.median(values),
+            "min": min(values),
+            "mean": statistics.fmean(values),
+        }
+    result["loaded"] = samples[-1]["loaded"]
+    return result
+
+
+def run(repeat=DEFAULT_REPEAT, workdir=None):
+    """
+    Times both start-up paths `repeat` times each (interleaved).
+    Returns {"meta": {...}, "results": {mode: stats}}.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="startup_bench_")
+    path = os.path.join(workdir, "startup.db")
+    db.set_database_path(path)
+    db.initialize_database()
+
+    samples = {"eager": [], "lazy": []}
+    for _ in range(repeat):
+        for mode, runs in samples.items():
+            runs.append(_sample(mode, path))
+
+    return {
+        "meta": {
+            "repeat": repeat,
+            "python": sys.version.split()[0],
+            "streamlit": samples["lazy"][-1]["streamlit"],
+        },
+        "results": {mode: _summarize(runs) for mode, runs in samples.items()},
+    }
+
+
+def print_report(report):
+    meta = report["meta"]
+    print(f"🚀 Cold start to login page, {meta['repeat']} fresh processes per path, "
+          f"Python {meta['python']}"
+          + ("" if meta["streamlit"] else " (streamlit not installed, not counted)"))
+    for mode, stats in report["results"].items():
+        print(f"   {mode:<6} imports {stats['imports_ms']['p50']:8.1f} ms   "
+              f"init {stats['init_ms']['p50']:7.2f} ms   "
+              f"total {stats['total_ms']['p50']:8.1f} ms   "
+              f"next session init {stats['rerun_init_ms']['p50']:7.3f} ms   "
+              f"loaded: {', '.join(stats['loaded']) or '-'}")
+
+    eager = report["results"]["eager"]["total_ms"]["p50"]
+    lazy = report["results"]["lazy"]["total_ms"]["p50"]
+    if eager > 0:
+        print(f"📉 Time to login page: {eager:.1f} → {lazy:.1f} ms "
+              f"({(lazy - eager) / eager:+.0%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start / time-to-login benchmark")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    report = run(args.repeat)
+    print_report(report)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results saved to {args.out}")
@@ -0,0 +1,199 @@
+"""
+benchmarks/synthetic.py
+-----------------------
+Deterministic synthetic dataset in the same CSV formats as data/.
+
+    python -m benchmarks.synthetic --listings 1000000 --out data/synthetic
+    python -m benchmarks.synthetic --listings 100000 --db database/synthetic.db
+
+The same --seed and --anchor-date always produce the same files.
+Cities follow a Zipf distribution (a few big cities, a long tail),
+receivers' claim activity is also Zipf-skewed, and claim statuses,
+expiry windows and claim times follow fixed distributions.
+"""
+
+import argparse
+import os
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from src.db import CSV_DATE_FORMAT, CSV_TIMESTAMP_FORMAT
+
+# =========================================================
+# GENERATOR CONFIG
+# =========================================================
+
+CITY_ZIPF_EXPONENT = 1.1
+RECEIVER_ZIPF_EXPONENT = 1.2
+LISTINGS_PER_CITY = 500
+LISTINGS_PER_PROVIDER = 10
+LISTINGS_PER_RECEIVER = 10
+CLAIMS_PER_LISTING = 1.0
+MAX_EXPIRY_DAYS = 14
+CLAIM_HISTORY_DAYS = 90
+WRITE_CHUNK_ROWS = 500_000
+
+FOOD_NAMES = [
+    "Bread", "Soup", "Fruits", "Vegetables", "Dairy", "Rice", "Pasta",
+    "Salad", "Chicken", "Fish", "Baked Goods", "Sandwiches", "Curry",
+]
+FOOD_TYPES = ["Vegetarian", "Non-Vegetarian", "Vegan"]
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner", "Snacks"]
+PROVIDER_TYPES = ["Restaurant", "Grocery Store", "Supermarket", "Catering Service"]
+RECEIVER_TYPES = ["Shelter", "Individual", "NGO", "Charity"]
+CLAIM_STATUSES = ["Completed", "Pending", "Cancelled"]
+CLAIM_STATUS_WEIGHTS = [0.6, 0.25, 0.15]
+
+# Cities are scattered around a few metro regions.
+REGIONS = [(40.7, -74.0), (34.0, -118.2), (41.9, -87.6), (29.8, -95.4), (47.6, -122.3)]
+REGION_SPREAD_DEG = 1.5
+
+
+def _zipf_weights(n, exponent):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _format_dates(days, anchor, fmt):
+    return (pd.Timestamp(anchor) + pd.to_timedelta(days, unit="D")).strftime(fmt)
+
+
+def _write(df, path, header):
+    df.to_csv(path, mode="w" if header else "a", header=header, index=False)
+
+
+# =========================================================
+# GENERATOR
+# =========================================================
+
+def generate(out_dir, listings=10_000, seed=42, anchor_date=None,
+             claims_per_listing=None):
+    """
+    Writes providers/receivers/food_listings/claims/city_gazetteer CSVs
+    into out_dir and returns their paths. Listings expire within
+    MAX_EXPIRY_DAYS after anchor_date; claims fall in the
+    CLAIM_HISTORY_DAYS before it.
+    """
+    anchor = anchor_date or date.today()
+    if isinstance(anchor, str):
+        anchor = datetime.strptime(anchor, "%Y-%m-%d").date()
+    claims_per_listing = CLAIMS_PER_LISTING if claims_per_listing is None else claims_per_listing
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        name: os.path.join(out_dir, f"{name}_data.csv")
+        for name in ("providers", "receivers", "food_listings", "claims")
+    }
+    paths["city_gazetteer"] = os.path.join(out_dir, "city_gazetteer.csv")
+
+    n_cities = max(20, listings // LISTINGS_PER_CITY)
+    n_providers = max(100, listings // LISTINGS_PER_PROVIDER)
+    n_receivers = max(100, listings // LISTINGS_PER_RECEIVER)
+    n_claims = int(listings * claims_per_listing)
+
+    # Cities + gazetteer
+    cities = np.array([f"City {i:06d}" for i in range(1, n_cities + 1)])
+    region = rng.integers(0, len(REGIONS), n_cities)
+    centers = np.array(REGIONS)[region]
+    pd.DataFrame({
+        "City": cities,
+        "Latitude": np.round(centers[:, 0] + rng.normal(0, REGION_SPREAD_DEG / 2, n_cities), 5),
+        "Longitude": np.round(centers[:, 1] + rng.normal(0, REGION_SPREAD_DEG / 2, n_cities), 5),
+    }).to_csv(paths["city_gazetteer"], index=False)
+    city_weights = _zipf_weights(n_cities, CITY_ZIPF_EXPONENT)
+
+    # Providers
+    provider_city = rng.choice(n_cities, n_providers, p=city_weights)
+    provider_type = rng.choice(PROVIDER_TYPES, n_providers)
+    pd.DataFrame({
+        "Provider_ID": np.arange(1, n_providers + 1),
+        "Name": [f"Provider {i}" for i in range(1, n_providers + 1)],
+        "Type": provider_type,
+        "Address": [f"{i} Market Street" for i in range(1, n_providers + 1)],
+        "City": cities[provider_city],
+        "Contact": [f"+1-555-{i:07d}" for i in range(1, n_providers + 1)],
+    }).to_csv(paths["providers"], index=False)
+
+    # Receivers
+    receiver_city = rng.choice(n_cities, n_receivers, p=city_weights)
+    pd.DataFrame({
+        "Receiver_ID": np.arange(1, n_receivers + 1),
+        "Name": [f"Receiver {i}" for i in range(1, n_receivers + 1)],
+        "Type": rng.choice(RECEIVER_TYPES, n_receivers),
+        "City": cities[receiver_city],
+        "Contact": [f"+1-555-{i:07d}" for i in range(1, n_receivers + 1)],
+    }).to_csv(paths["receivers"], index=False)
+
+    # Food listings (chunked so memory stays bounded at 10M rows).
+    # Listings are posted by a provider and located in its city.
+    for start in range(0, listings, WRITE_CHUNK_ROWS):
+        n = min(WRITE_CHUNK_ROWS, listings - start)
+        provider = rng.integers(0, n_providers, n)
+        _write(pd.DataFrame({
+            "Food_ID": np.arange(start + 1, start + n + 1),
+            "Food_Name": rng.choice(FOOD_NAMES, n),
+            "Quantity": rng.integers(1, 51, n),
+            "Expiry_Date": _format_dates(rng.integers(0, MAX_EXPIRY_DAYS + 1, n), anchor, CSV_DATE_FORMAT),
+            "Provider_ID": provider + 1,
+            "Provider_Type": provider_type[provider],
+            "Location": cities[provider_city[provider]],
+            "Food_Type": rng.choice(FOOD_TYPES, n),
+            "Meal_Type": rng.choice(MEAL_TYPES, n),
+        }), paths["food_listings"], header=start == 0)
+
+    # Claims: Zipf-skewed receivers, uniform listings, history before anchor.
+    receiver_weights = _zipf_weights(n_receivers, RECEIVER_ZIPF_EXPONENT)
+    receiver_order = rng.permutation(n_receivers)
+    _write(pd.DataFrame(columns=["Claim_ID", "Food_ID", "Receiver_ID", "Status", "Timestamp"]),
+           paths["claims"], header=True)
+    for start in range(0, n_claims, WRITE_CHUNK_ROWS):
+        n = min(WRITE_CHUNK_ROWS, n_claims - start)
+        minutes_ago = rng.integers(1, CLAIM_HISTORY_DAYS * 24 * 60, n)
+        _write(pd.DataFrame({
+            "Claim_ID": np.arange(start + 1, start + n + 1),
+            "Food_ID": rng.integers(1, listings + 1, n),
+            "Receiver_ID": receiver_order[rng.choice(n_receivers, n, p=receiver_weights)] + 1,
+            "Status": rng.choice(CLAIM_STATUSES, n, p=CLAIM_STATUS_WEIGHTS),
+            "Timestamp": _format_dates(-minutes_ago / (24 * 60), anchor, CSV_TIMESTAMP_FORMAT),
+        }), paths["claims"], header=False)
+
+    return paths
+
+
+def load_into_database(paths, db_path):
+    """
+    Creates (or updates) a database from generated CSVs using the
+    regular loaders. Returns the loaders' stats.
+    """
+    from src import db, load_data
+
+    db.set_database_path(db_path)
+    db.initialize_database()
+    return [
+        load_data.load_providers(paths["providers"]),
+        load_data.load_receivers(paths["receivers"]),
+        load_data.load_food_listings(paths["food_listings"]),
+        load_data.load_claims(paths["claims"]),
+        load_data.load_gazetteer(paths["city_gazetteer"]),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset")
+    parser.add_argument("--listings", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--anchor-date", help="YYYY-MM-DD (default: today)")
+    parser.add_argument("--claims-per-listing", type=float, default=CLAIMS_PER_LISTING)
+    parser.add_argument("--out", default="data/synthetic")
+    parser.add_argument("--db", help="also load the CSVs into this database file")
+    args = parser.parse_args()
+
+    paths = generate(args.out, args.listings, args.seed, args.anchor_date,
+                     args.claims_per_listing)
+    print(f"✅ Wrote synthetic CSVs to {args.out}")
+    if args.db:
+        load_into_database(paths, args.db)
+        print(f"✅ Loaded into {args.db}")
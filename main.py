@@ -2,11 +2,13 @@
 main.py
 ---------
 Initializes database tables and loads initial CSV data.
-Run this file ONLY ONCE during project setup.
+Safe to re-run: later runs only apply new or changed CSV rows.
 """
 
+from src.analytics import refresh_snapshot
 from src.db import initialize_database
 from src.load_data import load_all_data
+from src.queries import refresh_trends
 
 
 def main():
@@ -16,6 +18,12 @@ def main():
     print("📥 Loading initial dataset...")
     load_all_data()
 
+    print("📈 Updating trend rollups...")
+    refresh_trends()
+
+    print("📸 Refreshing analytics snapshot...")
+    refresh_snapshot()
+
     print("✅ Database setup and data loading completed successfully!")
 
 
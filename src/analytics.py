@@ -0,0 +1,200 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from src import db
+
+# =========================================================
+# ANALYTICS SNAPSHOT
+# =========================================================
+# EDA queries read a periodically refreshed, read-only copy of the
+# database instead of the live file, so heavy aggregations never hold
+# pages or a read transaction next to live claims.
+#
+# refresh_snapshot() copies the live DB with the sqlite3 backup API
+# into a temp file (one step, i.e. one consistent read transaction;
+# in WAL mode this does not block writers) and atomically renames it
+# over the snapshot. Snapshot age is the file's mtime, so every process
+# sees the same staleness. When the snapshot is missing or older than
+# ANALYTICS_MAX_STALENESS, analytics_connection() falls back to the
+# live database.
+
+ANALYTICS_REFRESH_INTERVAL = 300.0
+ANALYTICS_MAX_STALENESS = 1800.0
+ANALYTICS_POOL_SIZE = 4
+SNAPSHOT_SUFFIX = "_analytics"
+
+_pool = None
+_pool_mtime = None
+_pool_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_last_refresh = {"seconds": None, "error": None}
+
+
+def snapshot_path():
+    base, ext = os.path.splitext(db.DB_PATH)
+    return f"{base}{SNAPSHOT_SUFFIX}{ext or '.db'}"
+
+
+def snapshot_age(path=None):
+    """
+    Seconds since the snapshot was last refreshed, or None if missing.
+    """
+    try:
+        return max(0.0, time.time() - os.path.getmtime(path or snapshot_path()))
+    except OSError:
+        return None
+
+
+def refresh_snapshot():
+    """
+    Copies the live database into the snapshot file.
+    Returns the seconds the copy took.
+    """
+    path = snapshot_path()
+    tmp_path = path + ".tmp"
+    started = time.perf_counter()
+
+    with _refresh_lock:
+        try:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            target = sqlite3.connect(tmp_path)
+            try:
+                with db.pooled_connection() as source:
+                    source.backup(target)
+                # The copy inherits WAL mode; switch back so read-only
+                # connections do not need -wal/-shm files.
+                target.execute("PRAGMA journal_mode = DELETE;")
+            finally:
+                target.close()
+            os.replace(tmp_path, path)
+        except Exception as e:
+            _last_refresh["error"] = str(e)
+            raise
+
+        seconds = time.perf_counter() - started
+        _last_refresh.update(seconds=seconds, error=None)
+    return seconds
+
+
+def get_pool():
+    """
+    Read-only pool on the current snapshot, or None when there is no
+    fresh-enough snapshot. Reopened whenever the snapshot is replaced.
+    """
+    global _pool, _pool_mtime
+    path = snapshot_path()
+    age = snapshot_age(path)
+    if age is None or age > ANALYTICS_MAX_STALENESS:
+        return None
+
+    mtime = os.path.getmtime(path)
+    with _pool_lock:
+        if _pool is None or _pool_mtime != mtime or _pool.path != path:
+            if _pool is not None:
+                _pool.close()
+            _pool = db.ConnectionPool(path, size=ANALYTICS_POOL_SIZE, read_only=True)
+            _pool_mtime = mtime
+        return _pool
+
+
+@contextmanager
+def analytics_connection():
+    """
+    Connection for analytics reads: the snapshot when it is fresh
+    enough, otherwise a live pooled connection.
+    """
+    while True:
+        pool = get_pool()
+        if pool is None:
+            with db.pooled_connection() as conn:
+                yield conn
+            return
+        try:
+            conn = pool.acquire()
+        except RuntimeError:
+            if not pool.closed:
+                raise
+            # Replaced by a newer snapshot between get_pool() and
+            # acquire(); connections already out drain on release.
+            continue
+        break
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def snapshot_status():
+    age = snapshot_age()
+    return {
+        "path": snapshot_path(),
+        "exists": age is not None,
+        "refreshed_at": (
+            datetime.fromtimestamp(time.time() - age).isoformat(timespec="seconds")
+            if age is not None else None
+        ),
+        "age_seconds": age,
+        "refresh_interval": ANALYTICS_REFRESH_INTERVAL,
+        "max_staleness": ANALYTICS_MAX_STALENESS,
+        "serving": "snapshot" if age is not None and age <= ANALYTICS_MAX_STALENESS else "live",
+        "last_refresh_seconds": _last_refresh["seconds"],
+        "last_error": _last_refresh["error"],
+    }
+
+
+# =========================================================
+# BACKGROUND REFRESH
+# =========================================================
+
+class SnapshotRefresher(threading.Thread):
+    """
+    Daemon thread that runs refresh_snapshot() every `interval` seconds.
+    """
+
+    def __init__(self, interval=None):
+        super().__init__(name="analytics-snapshot", daemon=True)
+        self.interval = interval or ANALYTICS_REFRESH_INTERVAL
+        self.last_run = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            age = snapshot_age()
+            if age is None or age >= self.interval:
+                try:
+                    refresh_snapshot()
+                except Exception as e:
+                    print(f"⚠️ Analytics snapshot refresh failed: {e}")
+                self.last_run = time.time()
+                age = 0.0
+            self._stop_event.wait(max(1.0, self.interval - age))
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def start_background_refresher(interval=None):
+    """
+    Starts the in-process refresher once per process; later calls
+    return the running instance.
+    """
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = SnapshotRefresher(interval)
+            _refresher.start()
+        return _refresher
+
+
+if __name__ == "__main__":
+    seconds = refresh_snapshot()
+    print(f"✅ Analytics snapshot written to {snapshot_path()} in {seconds:.2f}s")
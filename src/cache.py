@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+# =========================================================
+# TTL + LRU CACHE
+# =========================================================
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries also expire
+    `ttl` seconds after they were stored (ttl=None disables expiry).
+    """
+
+    def __init__(self, max_entries=256, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._entries.get(key, MISSING)
+            if entry is not MISSING:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
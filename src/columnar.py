@@ -0,0 +1,241 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src import db
+from src.analytics import analytics_connection
+
+# =========================================================
+# COLUMNAR SNAPSHOT
+# =========================================================
+# Exports tables as one .npy file per column plus a manifest.json, so
+# analytics code can memory-map a multi-million row table instead of
+# building a DataFrame from fetchall() tuples.
+#
+#   INTEGER / REAL  -> int64 / float64 (+ <col>.nulls.npy when NULLs exist)
+#   date/time TEXT  -> datetime64[s] (NULL = NaT)
+#   other TEXT      -> dictionary-encoded: <col>.codes.npy (-1 = NULL)
+#                      and <col>.dict.npy with the distinct values
+#
+# Codes use the smallest integer type pandas itself would pick for the
+# dictionary size, so load_table() can wrap them without a copy.
+
+COLUMNAR_TABLES = ["providers", "receivers", "food_listings", "claims"]
+DATETIME_COLUMNS = {"expiry_date", "expired_at", "timestamp", "created_at"}
+EXPORT_CHUNK_ROWS = 100_000
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def columnar_dir():
+    return os.path.join(db.DB_FOLDER, "columnar")
+
+
+def _column_kind(name, declared_type):
+    declared_type = (declared_type or "").upper()
+    if name in DATETIME_COLUMNS:
+        return "datetime"
+    if "INT" in declared_type:
+        return "int"
+    if any(t in declared_type for t in ("REAL", "FLOA", "DOUB")):
+        return "float"
+    return "category"
+
+
+def _codes_dtype(size):
+    # Mirrors pandas' own choice for Categorical codes.
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class _ColumnWriter:
+    def __init__(self, table_dir, name, kind, rows):
+        self.dir = table_dir
+        self.name = name
+        self.kind = kind
+        self.has_nulls = False
+        dtype = {
+            "int": np.int64,
+            "float": np.float64,
+            "datetime": "datetime64[s]",
+            "category": np.int32,
+        }[kind]
+        self.values = np.lib.format.open_memmap(
+            self._path("tmp" if kind == "category" else "values"),
+            mode="w+", dtype=dtype, shape=(rows,)
+        )
+        self.nulls = np.zeros(rows, dtype=bool) if kind == "int" else None
+        self.dictionary = {}
+
+    def _path(self, part):
+        return os.path.join(self.dir, f"{self.name}.{part}.npy")
+
+    def write(self, start, values):
+        end = start + len(values)
+        if self.kind in ("int", "float"):
+            values = np.array(values, dtype=object)
+            mask = np.equal(values, None)
+            if self.kind == "int":
+                self.nulls[start:end] = mask
+                self.has_nulls |= bool(mask.any())
+            self.values[start:end] = np.where(mask, 0 if self.kind == "int" else np.nan, values)
+        elif self.kind == "datetime":
+            parsed = pd.to_datetime(pd.Series(values, dtype="object"),
+                                    errors="coerce", format="ISO8601")
+            self.values[start:end] = parsed.to_numpy("datetime64[s]")
+        else:
+            codes, uniques = pd.factorize(pd.Series(values, dtype="object"))
+            lookup = self.dictionary
+            mapping = np.array(
+                [lookup.setdefault(v, len(lookup)) for v in uniques] + [-1],
+                dtype=np.int32
+            )
+            self.values[start:end] = mapping[codes]  # code -1 -> trailing -1
+
+    def finish(self):
+        info = {"kind": self.kind}
+        if self.kind == "category":
+            codes = np.lib.format.open_memmap(
+                self._path("codes"), mode="w+",
+                dtype=_codes_dtype(len(self.dictionary)), shape=self.values.shape
+            )
+            for start in range(0, len(codes), EXPORT_CHUNK_ROWS):
+                codes[start:start + EXPORT_CHUNK_ROWS] = self.values[start:start + EXPORT_CHUNK_ROWS]
+            codes.flush()
+            del self.values
+            os.remove(self._path("tmp"))
+            np.save(self._path("dict"), np.array(
+                [str(v) for v in self.dictionary], dtype=str
+            ))
+            info.update(file=f"{self.name}.codes.npy", dictionary=f"{self.name}.dict.npy",
+                        dtype=str(codes.dtype), cardinality=len(self.dictionary))
+            return info
+
+        self.values.flush()
+        info.update(file=f"{self.name}.values.npy", dtype=str(self.values.dtype))
+        if self.has_nulls:
+            np.save(self._path("nulls"), self.nulls)
+            info["nulls"] = f"{self.name}.nulls.npy"
+        return info
+
+
+def _export_table(conn, table, out_dir):
+    table_dir = os.path.join(out_dir, table)
+    os.makedirs(table_dir, exist_ok=True)
+
+    columns = [(row[1], row[2]) for row in conn.execute(f"PRAGMA table_info({table})")]
+    rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    writers = [
+        _ColumnWriter(table_dir, name, _column_kind(name, declared), rows)
+        for name, declared in columns
+    ]
+
+    cursor = conn.execute(
+        f"SELECT {', '.join(name for name, _ in columns)} FROM {table} ORDER BY rowid"
+    )
+    start = 0
+    while True:
+        chunk = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+        if not chunk:
+            break
+        for writer, values in zip(writers, zip(*chunk)):
+            writer.write(start, values)
+        start += len(chunk)
+
+    return {
+        "rows": start,
+        "columns": {writer.name: writer.finish() for writer in writers},
+    }
+
+
+def export_columnar(out_dir=None, tables=None):
+    """
+    Writes a columnar snapshot of `tables` into out_dir (replacing any
+    previous export atomically) from one read transaction. Reads the
+    analytics snapshot when it is fresh, otherwise the live database.
+    Returns the manifest.
+    """
+    out_dir = out_dir or columnar_dir()
+    tables = tables or COLUMNAR_TABLES
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    started = time.perf_counter()
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "tables": {},
+    }
+    with analytics_connection() as conn:
+        conn.execute("BEGIN")
+        try:
+            for table in tables:
+                manifest["tables"][table] = _export_table(conn, table, tmp_dir)
+        finally:
+            conn.rollback()
+    manifest["export_seconds"] = time.perf_counter() - started
+
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_dir = out_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+
+# =========================================================
+# LOADER
+# =========================================================
+
+def load_manifest(path=None):
+    with open(os.path.join(path or columnar_dir(), MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def _load_column(table_dir, info):
+    values = np.load(os.path.join(table_dir, info["file"]), mmap_mode="r")
+    kind = info["kind"]
+    if kind == "category":
+        dictionary = np.load(os.path.join(table_dir, info["dictionary"]))
+        dtype = pd.CategoricalDtype(pd.Index(dictionary, dtype=object))
+        return pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+    if kind == "int" and "nulls" in info:
+        nulls = np.load(os.path.join(table_dir, info["nulls"]), mmap_mode="r")
+        return pd.arrays.IntegerArray(values, nulls)
+    return values
+
+
+def load_table(table, path=None, columns=None):
+    """
+    Returns `table` as a DataFrame whose columns are backed by
+    read-only np.memmap arrays (strings as categoricals over the
+    memory-mapped codes). Nothing is read into RAM until used.
+    """
+    path = path or columnar_dir()
+    info = load_manifest(path)["tables"][table]
+    table_dir = os.path.join(path, table)
+    names = columns or list(info["columns"])
+    return pd.DataFrame(
+        {name: _load_column(table_dir, info["columns"][name]) for name in names},
+        copy=False,
+    )
+
+
+if __name__ == "__main__":
+    manifest = export_columnar()
+    for table, info in manifest["tables"].items():
+        print(f"   {table}: {info['rows']:,} rows, {len(info['columns'])} columns")
+    print(f"✅ Columnar snapshot written to {columnar_dir()} "
+          f"in {manifest['export_seconds']:.2f}s")
@@ -0,0 +1,387 @@
+import threading
+import time
+
+import numpy as np
+
+from src import queries
+from src.db import pooled_connection
+
+# =========================================================
+# OLAP CUBE
+# =========================================================
+# In-memory aggregate cube over city x food_type x meal_type x
+# provider_type x day, stored sparsely: one row per non-empty cell with
+# int32 dimension codes and int64 measures. Roll-ups, slices and top-k
+# are vectorized NumPy group-bys over the cells (not the raw rows) and
+# are memoized until the cube next changes, so repeated dashboard
+# aggregates are dictionary lookups.
+#
+# "day" is the listing's expiry date for listing measures (quantity,
+# listings) and the claim date for claim measures.
+#
+# update() applies listings and claims added since the last build
+# (by id high-water mark); claims made through queries.claim_food()
+# also take their units off the listing's quantity cell. If the cube's
+# totals then disagree with the trigger-maintained summary tables
+# (e.g. after a CSV re-load changed existing rows) it rebuilds.
+
+DIMENSIONS = ("city", "food_type", "meal_type", "provider_type", "day")
+CLAIM_STATUSES = ("Pending", "Completed", "Cancelled")
+MEASURES = ("quantity", "listings", "claims") + tuple(
+    f"claims_{status.lower()}" for status in CLAIM_STATUSES
+)
+CUBE_MAX_AGE = 60.0
+
+_LISTING_DIMS = """
+    f.location, f.food_type, f.meal_type, IFNULL(f.provider_type, '')
+"""
+_STATUS_COUNTS = ", ".join(
+    f"SUM(c.status = '{status}')" for status in CLAIM_STATUSES
+)
+
+
+def _dim_index(dim):
+    try:
+        return DIMENSIONS.index(dim)
+    except ValueError:
+        raise ValueError(f"Unknown dimension {dim!r}; expected one of {DIMENSIONS}")
+
+
+def _measure_index(measure):
+    try:
+        return MEASURES.index(measure)
+    except ValueError:
+        raise ValueError(f"Unknown measure {measure!r}; expected one of {MEASURES}")
+
+
+def _group(codes, values, shape):
+    """
+    Sums `values` rows that share the same `codes` row.
+    Returns (unique codes sorted by label order, summed values).
+    """
+    if not len(codes):
+        return codes, values
+    keys = np.ravel_multi_index(codes.T, shape)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    summed = np.empty((len(unique_keys), values.shape[1]), dtype=np.int64)
+    for m in range(values.shape[1]):
+        summed[:, m] = np.bincount(inverse, weights=values[:, m], minlength=len(unique_keys))
+    codes = np.stack(np.unravel_index(unique_keys, shape), axis=1).astype(np.int32)
+    return codes, summed
+
+
+def _empty_labels():
+    return {dim: np.array([], dtype=object) for dim in DIMENSIONS}
+
+
+def _shape(labels):
+    return tuple(max(1, len(labels[dim])) for dim in DIMENSIONS)
+
+
+def _merge(labels, codes, values, rows):
+    """
+    Returns new (labels, codes, values) with the aggregated `rows`
+    added; the inputs are left untouched.
+    """
+    if not rows:
+        return labels, codes, values
+    n_dims = len(DIMENSIONS)
+    columns = list(zip(*rows))
+    new_codes = np.empty((len(rows), n_dims), dtype=np.int32)
+    codes = codes.copy()
+    merged = {}
+
+    for d, dim in enumerate(DIMENSIONS):
+        incoming = np.array(columns[d], dtype=object)
+        old_labels = labels[dim]
+        merged[dim] = np.union1d(old_labels, incoming).astype(object)
+        if len(old_labels) != len(merged[dim]):
+            codes[:, d] = np.searchsorted(merged[dim], old_labels)[codes[:, d]]
+        new_codes[:, d] = np.searchsorted(merged[dim], incoming)
+
+    codes, values = _group(
+        np.concatenate([codes, new_codes]),
+        np.concatenate([values, np.array(columns[n_dims:], dtype=np.int64).T]),
+        _shape(merged),
+    )
+    return merged, codes, values
+
+
+def _filter_key(filters):
+    return tuple(sorted(
+        (dim, ("slice", value.start, value.stop) if isinstance(value, slice)
+         else tuple(value) if isinstance(value, (list, tuple, set, frozenset))
+         else value)
+        for dim, value in filters.items()
+    ))
+
+
+class Cube:
+    """
+    Sparse aggregate cube. Build with Cube.build(); query with
+    rollup(), slice(), top_k() and total().
+
+    labels, codes, values and the memo live in one tuple that updates
+    replace as a whole and never modify, so a query (or a slice) keeps
+    working on the state it started with while the cube is updated.
+    """
+
+    def __init__(self, labels=None, codes=None, values=None):
+        self._data = (
+            labels or _empty_labels(),
+            np.zeros((0, len(DIMENSIONS)), dtype=np.int32) if codes is None else codes,
+            np.zeros((0, len(MEASURES)), dtype=np.int64) if values is None else values,
+            {},
+        )
+        self.max_food_id = 0
+        self.max_claim_id = 0
+        self.data_version = None
+        self.updated_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def labels(self):
+        return self._data[0]
+
+    @property
+    def codes(self):
+        return self._data[1]
+
+    @property
+    def values(self):
+        return self._data[2]
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def shape(self):
+        return _shape(self.labels)
+
+    # -----------------------------------------------------
+    # Loading
+    # -----------------------------------------------------
+
+    @classmethod
+    def build(cls):
+        cube = cls()
+        cube.rebuild()
+        return cube
+
+    def rebuild(self):
+        with self._lock:
+            self._apply(full=True)
+
+    def update(self):
+        """
+        Applies rows added since the last build/update.
+        Returns the number of aggregated rows applied.
+        """
+        with self._lock:
+            return self._apply(full=False)
+
+    def _apply(self, full):
+        food_after = 0 if full else self.max_food_id
+        claim_after = 0 if full else self.max_claim_id
+        zeros = (0,) * len(CLAIM_STATUSES)
+
+        with pooled_connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                max_food_id, max_claim_id = conn.execute("""
+                    SELECT (SELECT IFNULL(MAX(food_id), 0) FROM food_listings),
+                           (SELECT IFNULL(MAX(claim_id), 0) FROM claims)
+                """).fetchone()
+
+                rows = [
+                    row + (0,) + zeros
+                    for row in conn.execute(f"""
+                        SELECT {_LISTING_DIMS}, IFNULL(f.expiry_date, ''),
+                               SUM(f.quantity), COUNT(*)
+                        FROM food_listings f
+                        WHERE f.food_id > ? AND f.food_id <= ?
+                        GROUP BY 1, 2, 3, 4, 5
+                    """, (food_after, max_food_id))
+                ]
+                rows += [
+                    row[:5] + (0, 0) + row[5:]
+                    for row in conn.execute(f"""
+                        SELECT IFNULL(f.location, ''), IFNULL(f.food_type, ''),
+                               IFNULL(f.meal_type, ''), IFNULL(f.provider_type, ''),
+                               IFNULL(DATE(c.timestamp), ''),
+                               COUNT(*), {_STATUS_COUNTS}
+                        FROM claims c
+                        LEFT JOIN food_listings f ON f.food_id = c.food_id
+                        WHERE c.claim_id > ? AND c.claim_id <= ?
+                        GROUP BY 1, 2, 3, 4, 5
+                    """, (claim_after, max_claim_id))
+                ]
+                if not full:
+                    # Units claimed from listings already in the cube.
+                    rows += [
+                        row[:5] + (-row[5], 0, 0) + zeros
+                        for row in conn.execute(f"""
+                            SELECT {_LISTING_DIMS}, IFNULL(f.expiry_date, ''),
+                                   SUM(c.units)
+                            FROM claims c
+                            JOIN food_listings f ON f.food_id = c.food_id
+                            WHERE c.claim_id > ? AND c.claim_id <= ?
+                              AND c.food_id <= ?
+                            GROUP BY 1, 2, 3, 4, 5
+                        """, (claim_after, max_claim_id, food_after))
+                    ]
+                expected = conn.execute(f"""
+                    SELECT (SELECT IFNULL(SUM(total_quantity), 0) FROM summary_city),
+                           (SELECT IFNULL(SUM(listing_count), 0) FROM summary_city),
+                           {", ".join(
+                               f"(SELECT IFNULL(SUM(claim_count), 0) FROM summary_claim_status "
+                               f"WHERE status = '{status}')"
+                               for status in CLAIM_STATUSES
+                           )}
+                """).fetchone()
+            finally:
+                conn.rollback()
+
+        base = Cube() if full else self
+        labels, codes, values = _merge(*base._data[:3], rows)
+        self._data = (labels, codes, values, {})
+        self.max_food_id, self.max_claim_id = max_food_id, max_claim_id
+        self.data_version = queries.data_version()
+        self.updated_at = time.time()
+
+        totals = values.sum(axis=0) if len(values) else np.zeros(len(MEASURES), np.int64)
+        actual = (totals[0], totals[1]) + tuple(totals[3:])
+        if not full and tuple(int(v) for v in actual) != tuple(expected):
+            return self._apply(full=True)
+        return len(rows)
+
+    # -----------------------------------------------------
+    # Queries
+    # -----------------------------------------------------
+
+    @staticmethod
+    def _mask(all_labels, codes, filters):
+        mask = np.ones(len(codes), dtype=bool)
+        for dim, value in filters.items():
+            d = _dim_index(dim)
+            labels, column = all_labels[dim], codes[:, d]
+            if isinstance(value, slice):
+                lo = 0 if value.start is None else np.searchsorted(labels, value.start, "left")
+                hi = len(labels) if value.stop is None else np.searchsorted(labels, value.stop, "right")
+                mask &= (column >= lo) & (column < hi)
+            else:
+                wanted = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+                known = set(labels)
+                wanted = [label for label in wanted if label in known]
+                mask &= np.isin(column, np.searchsorted(labels, np.array(wanted, dtype=object)))
+        return mask
+
+    def slice(self, **filters):
+        """
+        Sub-cube keeping only cells matching every filter:
+        dim=value, dim=[values] or dim=slice(first, last) (inclusive).
+        """
+        labels, codes, values, memo = self._data
+        key = ("slice", _filter_key(filters))
+        cube = memo.get(key)
+        if cube is None:
+            mask = self._mask(labels, codes, filters)
+            cube = Cube(dict(labels), codes[mask], values[mask])
+            cube.data_version, cube.updated_at = self.data_version, self.updated_at
+            memo[key] = cube
+        return cube
+
+    def rollup(self, *dims, measures=("quantity",)):
+        """
+        Aggregates to the given dimensions (none = grand total).
+        Returns [(label, ..., measure, ...)] ordered by labels, keeping
+        only groups where some requested measure is non-zero.
+        """
+        if isinstance(measures, str):
+            measures = (measures,)
+        all_labels, all_codes, all_values, memo = self._data
+        key = ("rollup", dims, tuple(measures))
+        result = memo.get(key)
+        if result is None:
+            d_idx = [_dim_index(dim) for dim in dims]
+            m_idx = [_measure_index(m) for m in measures]
+            if d_idx:
+                full_shape = _shape(all_labels)
+                shape = tuple(full_shape[d] for d in d_idx)
+                codes, values = _group(all_codes[:, d_idx], all_values[:, m_idx], shape)
+            else:
+                codes = np.zeros((1, 0), dtype=np.int32)
+                values = all_values[:, m_idx].sum(axis=0, keepdims=True)
+            keep = values.any(axis=1)
+            codes, values = codes[keep], values[keep]
+            labels = [all_labels[dims[i]][codes[:, i]] for i in range(len(dims))]
+            result = [
+                tuple(row[:len(dims)]) + tuple(int(v) for v in row[len(dims):])
+                for row in zip(*labels, *values.T)
+            ]
+            memo[key] = result
+        return list(result)
+
+    def top_k(self, dim, measure="quantity", k=5):
+        """
+        The k labels of `dim` with the largest `measure`, descending.
+        """
+        labels, codes, values, memo = self._data
+        key = ("top_k", dim, measure, k)
+        result = memo.get(key)
+        if result is None:
+            d, m = _dim_index(dim), _measure_index(measure)
+            totals = np.bincount(
+                codes[:, d], weights=values[:, m], minlength=_shape(labels)[d]
+            ).astype(np.int64)
+            k = min(k, int((totals != 0).sum()))
+            top = np.argpartition(-totals, k - 1)[:k] if k else np.array([], dtype=int)
+            top = top[np.argsort(-totals[top], kind="stable")]
+            result = [(labels[dim][i], int(totals[i])) for i in top]
+            memo[key] = result
+        return list(result)
+
+    def total(self, measure="quantity"):
+        return int(self.values[:, _measure_index(measure)].sum())
+
+
+# =========================================================
+# SHARED CUBE
+# =========================================================
+
+_cube = None
+_cube_lock = threading.Lock()
+
+
+def get_cube(max_age=None):
+    """
+    Process-wide cube: built on first use, updated incrementally when
+    this process has written (data version changed) or it is older
+    than CUBE_MAX_AGE seconds (writes from other processes).
+    """
+    global _cube
+    max_age = CUBE_MAX_AGE if max_age is None else max_age
+    with _cube_lock:
+        if _cube is None:
+            _cube = Cube.build()
+        elif (_cube.data_version != queries.data_version()
+              or time.time() - _cube.updated_at > max_age):
+            _cube.update()
+        return _cube
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    cube = Cube.build()
+    print(f"🧊 {len(cube):,} cells built in {time.perf_counter() - started:.2f}s")
+    for label, call in [
+        ("food by city", lambda: cube.top_k("city", "quantity", 5)),
+        ("food types", lambda: cube.rollup("food_type", measures="listings")),
+        ("claims by day", lambda: cube.rollup("day", measures="claims")),
+        ("claim status", lambda: cube.rollup(measures=MEASURES[3:])),
+    ]:
+        call()
+        started = time.perf_counter()
+        result = call()
+        print(f"   {label}: {(time.perf_counter() - started) * 1e6:.1f} µs (memoized), "
+              f"{len(result)} rows")
@@ -1,5 +1,11 @@
 import sqlite3
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
 
 # =========================================================
 # DATABASE CONFIG
@@ -8,6 +14,24 @@ import os
 DB_FOLDER = "database"
 DB_PATH = os.path.join(DB_FOLDER, "food_waste.db")
 
+# Connection tuning applied to every pooled connection.
+# Override with configure_pool() before the first query runs.
+POOL_SIZE = 8
+POOL_TIMEOUT = 30.0
+BUSY_TIMEOUT_MS = 5000
+SYNCHRONOUS = "NORMAL"
+CACHE_SIZE_KB = 16384
+MMAP_SIZE = 128 * 1024 * 1024
+
+# Stored date formats (ISO-8601 text: sorts correctly and works with
+# SQLite's DATE()/strftime()).
+DATE_FORMAT = "%Y-%m-%d"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Legacy formats found in the demo CSVs.
+CSV_DATE_FORMAT = "%m/%d/%Y"
+CSV_TIMESTAMP_FORMAT = "%m/%d/%Y %H:%M"
+
 
 # =========================================================
 # CONNECTION
@@ -25,15 +49,316 @@ def get_connection():
     return conn
 
 
+def _open_tuned_connection(path, busy_timeout_ms, synchronous,
+                           cache_size_kb, mmap_size, read_only=False):
+    if read_only:
+        conn = sqlite3.connect(
+            Path(path).absolute().as_uri() + "?mode=ro",
+            uri=True,
+            timeout=busy_timeout_ms / 1000,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA query_only = ON;")
+    else:
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(
+            path,
+            timeout=busy_timeout_ms / 1000,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute(f"PRAGMA synchronous = {synchronous};")
+        conn.execute("PRAGMA foreign_keys = ON;")
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)};")
+    conn.execute(f"PRAGMA cache_size = {-int(cache_size_kb)};")
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)};")
+    return conn
+
+
+# =========================================================
+# DATE NORMALIZATION
+# =========================================================
+
+def _parse_datetime(value, formats):
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date value: {value!r}")
+
+
+def to_iso_date(value):
+    """
+    Normalizes a date / datetime / date string to 'YYYY-MM-DD'.
+    """
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    if isinstance(value, date):
+        return value.strftime(DATE_FORMAT)
+    value = str(value).strip()
+    parsed = _parse_datetime(value[:10] if "-" in value else value, (
+        DATE_FORMAT, CSV_DATE_FORMAT, CSV_TIMESTAMP_FORMAT
+    ))
+    return parsed.strftime(DATE_FORMAT)
+
+
+def to_iso_timestamp(value):
+    """
+    Normalizes a datetime / date / timestamp string to
+    'YYYY-MM-DD HH:MM:SS'.
+    """
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    if isinstance(value, date):
+        return value.strftime(DATE_FORMAT) + " 00:00:00"
+    value = str(value).strip()
+    parsed = _parse_datetime(value[:19] if "-" in value else value, (
+        TIMESTAMP_FORMAT, "%Y-%m-%dT%H:%M:%S", DATE_FORMAT,
+        CSV_TIMESTAMP_FORMAT, CSV_DATE_FORMAT
+    ))
+    return parsed.strftime(TIMESTAMP_FORMAT)
+
+
+# =========================================================
+# CONNECTION POOL
+# =========================================================
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of reusable SQLite connections.
+
+    Connections are opened lazily in WAL mode (readers never block the
+    writer) and handed out through the connection() context manager.
+    At most `size` connections are checked out at once; further callers
+    wait up to `timeout` seconds for one to be returned.
+    read_only=True opens an existing file with mode=ro / query_only.
+    """
+
+    def __init__(self, path=None, size=None, timeout=None,
+                 busy_timeout_ms=None, synchronous=None,
+                 cache_size_kb=None, mmap_size=None, read_only=False):
+        self.path = path or DB_PATH
+        self.read_only = read_only
+        self.size = size or POOL_SIZE
+        self.timeout = POOL_TIMEOUT if timeout is None else timeout
+        self.busy_timeout_ms = busy_timeout_ms or BUSY_TIMEOUT_MS
+        self.synchronous = synchronous or SYNCHRONOUS
+        self.cache_size_kb = cache_size_kb or CACHE_SIZE_KB
+        self.mmap_size = MMAP_SIZE if mmap_size is None else mmap_size
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._all = []
+        self._closed = False
+        self._trace = None
+
+    def _open(self):
+        conn = _open_tuned_connection(
+            self.path, self.busy_timeout_ms, self.synchronous,
+            self.cache_size_kb, self.mmap_size, self.read_only
+        )
+        with self._lock:
+            conn.set_trace_callback(self._effective_trace())
+            self._all.append(conn)
+        return conn
+
+    def _effective_trace(self):
+        trace, hook = self._trace, _statement_hook
+        if trace is None or hook is None:
+            return trace or hook
+
+        def both(sql):
+            trace(sql)
+            hook(sql)
+        return both
+
+    def _install_trace(self):
+        with self._lock:
+            callback = self._effective_trace()
+            for conn in self._all:
+                conn.set_trace_callback(callback)
+
+    def set_trace_callback(self, callback):
+        """
+        Installs (or clears, with None) a statement trace callback on every
+        pooled connection, including ones opened later.
+        """
+        self._trace = callback
+        self._install_trace()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def acquire(self):
+        hook = _acquire_hook
+        if hook is None:
+            return self._checkout()
+        started = time.perf_counter()
+        conn = self._checkout()
+        hook(time.perf_counter() - started)
+        return conn
+
+    def _checkout(self):
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(
+                f"No database connection available after {self.timeout}s"
+            )
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._open()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                with self._lock:
+                    if conn in self._all:
+                        self._all.remove(conn)
+                conn.close()
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks a connection out of the pool and returns it on exit.
+        Any transaction left open (e.g. after an exception) is rolled back.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """
+        Closes idle connections now; checked-out ones are closed when
+        they are released, so in-flight queries can finish.
+        """
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._all.remove(conn)
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_settings = {}
+
+# Process-wide observers installed by src/instrument.py (None = off).
+_acquire_hook = None
+_statement_hook = None
+
+
+def configure_pool(**settings):
+    """
+    Overrides pool / pragma settings (size, timeout, busy_timeout_ms,
+    synchronous, cache_size_kb, mmap_size, path).
+    Existing pooled connections are closed and reopened on next use.
+    """
+    global _pool
+    with _pool_lock:
+        _pool_settings.update(settings)
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(**_pool_settings)
+    return _pool
+
+
+def pooled_connection():
+    """
+    Context manager yielding a pooled, tuned connection:
+
+        with pooled_connection() as conn:
+            conn.execute(...)
+    """
+    return get_pool().connection()
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def set_pool_hooks(on_acquire=None, on_statement=None):
+    """
+    Installs observers on the current and any future pool:
+    on_acquire(seconds waited for a connection) and on_statement(sql)
+    for every statement run on a pooled connection. None removes them.
+    """
+    global _acquire_hook, _statement_hook
+    _acquire_hook, _statement_hook = on_acquire, on_statement
+    pool = _pool
+    if pool is not None:
+        pool._install_trace()
+
+
+def set_database_path(path):
+    """
+    Points get_connection() and the pool at a different database file
+    (used by benchmarks and tooling). Closes any pooled connections.
+    """
+    global DB_FOLDER, DB_PATH, _initialized_path
+    DB_PATH = path
+    _initialized_path = None
+    DB_FOLDER = os.path.dirname(path) or "."
+    _pool_settings.pop("path", None)
+    close_pool()
+
+
 # =========================================================
 # TABLE CREATION
 # =========================================================
 
-def create_users_table():
-    conn = get_connection()
-    cursor = conn.cursor()
+def _create_table(conn, ddl):
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    try:
+        conn.execute(ddl)
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
 
-    cursor.execute("""
+
+def create_users_table(conn=None):
+    _create_table(conn, """
         CREATE TABLE IF NOT EXISTS users (
             user_id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT UNIQUE NOT NULL,
@@ -44,15 +369,9 @@ def create_users_table():
         )
     """)
 
-    conn.commit()
-    conn.close()
 
-
-def create_providers_table():
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
+def create_providers_table(conn=None):
+    _create_table(conn, """
         CREATE TABLE IF NOT EXISTS providers (
             provider_id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
@@ -63,19 +382,13 @@ def create_providers_table():
         )
     """)
 
-    conn.commit()
-    conn.close()
-
 
-def create_receivers_table():
+def create_receivers_table(conn=None):
     """
     Receiver profile created by logged-in users.
     One-to-one mapping with users table.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
+    _create_table(conn, """
         CREATE TABLE IF NOT EXISTS receivers (
             receiver_id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER UNIQUE,
@@ -87,15 +400,9 @@ def create_receivers_table():
         )
     """)
 
-    conn.commit()
-    conn.close()
-
 
-def create_food_listings_table():
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
+def create_food_listings_table(conn=None):
+    _create_table(conn, """
         CREATE TABLE IF NOT EXISTS food_listings (
             food_id INTEGER PRIMARY KEY AUTOINCREMENT,
             food_name TEXT NOT NULL,
@@ -111,15 +418,9 @@ def create_food_listings_table():
         )
     """)
 
-    conn.commit()
-    conn.close()
-
 
-def create_claims_table():
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
+def create_claims_table(conn=None):
+    _create_table(conn, """
         CREATE TABLE IF NOT EXISTS claims (
             claim_id INTEGER PRIMARY KEY AUTOINCREMENT,
             food_id INTEGER NOT NULL,
@@ -131,21 +432,847 @@ def create_claims_table():
         )
     """)
 
-    conn.commit()
-    conn.close()
+
+# =========================================================
+# SUMMARY TABLES
+# =========================================================
+# Pre-aggregated dashboard metrics kept in sync with food_listings and
+# claims by triggers, so reads cost O(groups) instead of O(rows).
+
+SUMMARY_TABLES = (
+    "summary_city",
+    "summary_food_type",
+    "summary_claim_status",
+    "summary_claims_daily",
+)
+
+
+def _listing_delta_sql(row, sign):
+    return f"""
+        INSERT INTO summary_city (location, total_quantity, listing_count)
+        VALUES ({row}.location, {sign} {row}.quantity, {sign} 1)
+        ON CONFLICT(location) DO UPDATE SET
+            total_quantity = total_quantity + excluded.total_quantity,
+            listing_count = listing_count + excluded.listing_count;
+        INSERT INTO summary_food_type (food_type, listing_count)
+        VALUES ({row}.food_type, {sign} 1)
+        ON CONFLICT(food_type) DO UPDATE SET
+            listing_count = listing_count + excluded.listing_count;
+    """
+
+
+def _claim_delta_sql(row, sign):
+    return f"""
+        INSERT INTO summary_claim_status (status, claim_count)
+        VALUES ({row}.status, {sign} 1)
+        ON CONFLICT(status) DO UPDATE SET
+            claim_count = claim_count + excluded.claim_count;
+        INSERT INTO summary_claims_daily (day, claim_count)
+        VALUES (IFNULL(DATE({row}.timestamp), ''), {sign} 1)
+        ON CONFLICT(day) DO UPDATE SET
+            claim_count = claim_count + excluded.claim_count;
+    """
+
+
+SUMMARY_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_food_listings_summary_insert
+    AFTER INSERT ON food_listings
+    BEGIN
+        {_listing_delta_sql("NEW", "+")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_food_listings_summary_delete
+    AFTER DELETE ON food_listings
+    BEGIN
+        {_listing_delta_sql("OLD", "-")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_food_listings_summary_update
+    AFTER UPDATE OF quantity, location, food_type ON food_listings
+    BEGIN
+        {_listing_delta_sql("OLD", "-")}
+        {_listing_delta_sql("NEW", "+")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_claims_summary_insert
+    AFTER INSERT ON claims
+    BEGIN
+        {_claim_delta_sql("NEW", "+")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_claims_summary_delete
+    AFTER DELETE ON claims
+    BEGIN
+        {_claim_delta_sql("OLD", "-")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_claims_summary_update
+    AFTER UPDATE OF status, timestamp ON claims
+    BEGIN
+        {_claim_delta_sql("OLD", "-")}
+        {_claim_delta_sql("NEW", "+")}
+    END
+    """,
+]
+
+# (summary query, base-table query) pairs with identical result shapes.
+_SUMMARY_CHECKS = {
+    "summary_city": (
+        """SELECT location, total_quantity, listing_count
+           FROM summary_city WHERE listing_count != 0 ORDER BY location""",
+        """SELECT location, SUM(quantity), COUNT(*)
+           FROM food_listings GROUP BY location ORDER BY location""",
+    ),
+    "summary_food_type": (
+        """SELECT food_type, listing_count
+           FROM summary_food_type WHERE listing_count != 0 ORDER BY food_type""",
+        """SELECT food_type, COUNT(*)
+           FROM food_listings GROUP BY food_type ORDER BY food_type""",
+    ),
+    "summary_claim_status": (
+        """SELECT status, claim_count
+           FROM summary_claim_status WHERE claim_count != 0 ORDER BY status""",
+        """SELECT status, COUNT(*)
+           FROM claims GROUP BY status ORDER BY status""",
+    ),
+    "summary_claims_daily": (
+        """SELECT day, claim_count
+           FROM summary_claims_daily WHERE claim_count != 0 ORDER BY day""",
+        """SELECT IFNULL(DATE(timestamp), '') AS day, COUNT(*)
+           FROM claims GROUP BY day ORDER BY day""",
+    ),
+}
+
+
+def rebuild_summaries(cursor):
+    """
+    Recomputes every summary table from the base tables.
+    Runs inside the caller's transaction.
+    """
+    for table in SUMMARY_TABLES:
+        cursor.execute(f"DELETE FROM {table}")
+
+    cursor.execute("""
+        INSERT INTO summary_city (location, total_quantity, listing_count)
+        SELECT location, SUM(quantity), COUNT(*)
+        FROM food_listings GROUP BY location
+    """)
+    cursor.execute("""
+        INSERT INTO summary_food_type (food_type, listing_count)
+        SELECT food_type, COUNT(*)
+        FROM food_listings GROUP BY food_type
+    """)
+    cursor.execute("""
+        INSERT INTO summary_claim_status (status, claim_count)
+        SELECT status, COUNT(*)
+        FROM claims GROUP BY status
+    """)
+    cursor.execute("""
+        INSERT INTO summary_claims_daily (day, claim_count)
+        SELECT IFNULL(DATE(timestamp), ''), COUNT(*)
+        FROM claims GROUP BY IFNULL(DATE(timestamp), '')
+    """)
+
+
+def verify_summaries(conn):
+    """
+    Compares every summary table against the base tables.
+    Returns {table: (summary rows, expected rows)} for mismatches;
+    an empty dict means all summaries are consistent.
+    """
+    mismatches = {}
+    for table, (summary_sql, base_sql) in _SUMMARY_CHECKS.items():
+        actual = conn.execute(summary_sql).fetchall()
+        expected = conn.execute(base_sql).fetchall()
+        if actual != expected:
+            mismatches[table] = (actual, expected)
+    return mismatches
+
+
+# =========================================================
+# TIME-SERIES ROLLUPS
+# =========================================================
+# Claims (per status) and listings (quantity posted / expired) bucketed
+# at hour, day, week and month resolution. refresh_timeseries() folds
+# in only what arrived since the last refresh, tracked per source in
+# timeseries_watermarks:
+#   claims            last claim_id folded in
+#   listings_posted   last food_id folded in (bucketed by created_at)
+#   listings_expired  expired_at cutoff (set by the expiry sweeper)
+# Expiries are only folded in once they are TIMESERIES_SETTLE_SECONDS
+# old, so a sweep batch that commits late is never skipped. Status
+# changes to existing claims are not tracked; rebuild_timeseries()
+# recomputes everything.
+
+TIMESERIES_TABLES = ("timeseries_claims", "timeseries_listings")
+TIMESERIES_SETTLE_SECONDS = 60
+
+# Bucket start for a timestamp expression, finest first. Weeks start on
+# Monday.
+TIMESERIES_BUCKETS = {
+    "hour": "strftime('%Y-%m-%d %H:00', {ts})",
+    "day": "DATE({ts})",
+    "week": "DATE({ts}, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m-01', {ts})",
+}
+
+
+def _timeseries_position(cursor, source, default):
+    row = cursor.execute(
+        "SELECT position FROM timeseries_watermarks WHERE source = ?", (source,)
+    ).fetchone()
+    return default if row is None else row[0]
+
+
+def _set_timeseries_position(cursor, source, position):
+    cursor.execute("""
+        INSERT INTO timeseries_watermarks (source, position) VALUES (?, ?)
+        ON CONFLICT(source) DO UPDATE SET position = excluded.position
+    """, (source, position))
+
+
+def refresh_timeseries(cursor, now=None):
+    """
+    Folds claims and listings added (or expired) since the last refresh
+    into the rollup tables. Runs inside the caller's write transaction.
+    Returns the number of source rows folded in.
+    """
+    now = now or datetime.now()
+
+    claims_from = _timeseries_position(cursor, "claims", 0)
+    claims_to = cursor.execute("SELECT IFNULL(MAX(claim_id), 0) FROM claims").fetchone()[0]
+    listings_from = _timeseries_position(cursor, "listings_posted", 0)
+    listings_to = cursor.execute(
+        "SELECT IFNULL(MAX(food_id), 0) FROM food_listings"
+    ).fetchone()[0]
+    expired_from = _timeseries_position(cursor, "listings_expired", "")
+    expired_to = datetime.fromtimestamp(
+        now.timestamp() - TIMESERIES_SETTLE_SECONDS
+    ).strftime(TIMESTAMP_FORMAT)
+
+    for resolution, bucket in TIMESERIES_BUCKETS.items():
+        claim_bucket = bucket.format(ts="timestamp")
+        cursor.execute(f"""
+            INSERT INTO timeseries_claims (resolution, bucket, status, claim_count)
+            SELECT ?, {claim_bucket}, status, COUNT(*)
+            FROM claims
+            WHERE claim_id > ? AND claim_id <= ? AND {claim_bucket} IS NOT NULL
+            GROUP BY 2, 3
+            ON CONFLICT(resolution, bucket, status) DO UPDATE SET
+                claim_count = claim_count + excluded.claim_count
+        """, (resolution, claims_from, claims_to))
+
+        posted_bucket = bucket.format(ts="DATETIME(created_at, 'localtime')")
+        cursor.execute(f"""
+            INSERT INTO timeseries_listings
+                (resolution, bucket, quantity_posted, listings_posted)
+            SELECT ?, {posted_bucket}, SUM(quantity), COUNT(*)
+            FROM food_listings
+            WHERE food_id > ? AND food_id <= ? AND {posted_bucket} IS NOT NULL
+            GROUP BY 2
+            ON CONFLICT(resolution, bucket) DO UPDATE SET
+                quantity_posted = quantity_posted + excluded.quantity_posted,
+                listings_posted = listings_posted + excluded.listings_posted
+        """, (resolution, listings_from, listings_to))
+
+        expired_bucket = bucket.format(ts="expired_at")
+        cursor.execute(f"""
+            INSERT INTO timeseries_listings
+                (resolution, bucket, quantity_expired, listings_expired)
+            SELECT ?, {expired_bucket}, SUM(quantity), COUNT(*)
+            FROM food_listings
+            WHERE expired_at IS NOT NULL AND expired_at > ? AND expired_at <= ?
+              AND {expired_bucket} IS NOT NULL
+            GROUP BY 2
+            ON CONFLICT(resolution, bucket) DO UPDATE SET
+                quantity_expired = quantity_expired + excluded.quantity_expired,
+                listings_expired = listings_expired + excluded.listings_expired
+        """, (resolution, expired_from, expired_to))
+
+    _set_timeseries_position(cursor, "claims", claims_to)
+    _set_timeseries_position(cursor, "listings_posted", listings_to)
+    if expired_to > expired_from:
+        _set_timeseries_position(cursor, "listings_expired", expired_to)
+    return claims_to - claims_from + listings_to - listings_from
+
+
+def rebuild_timeseries(cursor):
+    """
+    Recomputes every rollup from the base tables.
+    Runs inside the caller's transaction.
+    """
+    for table in TIMESERIES_TABLES + ("timeseries_watermarks",):
+        cursor.execute(f"DELETE FROM {table}")
+    refresh_timeseries(cursor)
+
+
+# =========================================================
+# TRIGGER-FREE BULK WRITES
+# =========================================================
+# The summary, FTS and search-version triggers add several statements
+# to every inserted row. Bulk loads drop a table's triggers for one
+# write transaction and rebuild what they maintain once at the end.
+
+# Base tables feeding the summary tables, and the FTS index fed by each
+# indexed table.
+SUMMARY_SOURCES = ("food_listings", "claims")
+FTS_INDEXES = {"food_listings": "food_fts", "providers": "provider_fts"}
+
+
+def drop_triggers(cursor, table):
+    """
+    Drops every trigger on `table` and returns their CREATE statements
+    for restore_triggers(). Runs inside the caller's transaction.
+    """
+    triggers = cursor.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'trigger' AND tbl_name = ?
+        ORDER BY name
+    """, (table,)).fetchall()
+    for name, _ in triggers:
+        cursor.execute(f"DROP TRIGGER {name}")
+    return [sql for _, sql in triggers]
+
+
+def restore_triggers(cursor, table, triggers):
+    """
+    Recreates triggers dropped by drop_triggers(), then rebuilds the
+    summaries and FTS index they maintain and bumps the search index
+    version once. Runs inside the same transaction as the drop.
+    """
+    for sql in triggers:
+        cursor.execute(sql)
+    if table in SUMMARY_SOURCES:
+        rebuild_summaries(cursor)
+    fts = FTS_INDEXES.get(table)
+    if fts:
+        cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+        cursor.execute("UPDATE search_index_version SET version = version + 1 WHERE id = 1")
+
+
+# =========================================================
+# SCHEMA MIGRATIONS
+# =========================================================
+# Each migration is (version, description, function(cursor)).
+# Migrations run in version order, each inside its own transaction,
+# and are recorded in schema_version so they are applied exactly once.
+# Statements inside a migration must also be idempotent.
+
+def _migrate_hot_path_indexes(cursor):
+    # Discovery: city lookup / availability ordered by expiry.
+    # Partial on quantity > 0 so sold-out rows stay out of the index.
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_food_city_expiry
+        ON food_listings(location COLLATE NOCASE, expiry_date)
+        WHERE quantity > 0
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_food_available_expiry
+        ON food_listings(expiry_date)
+        WHERE quantity > 0
+    """)
+
+    # Aggregates: covering indexes so GROUP BYs never touch the table.
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_food_provider_qty
+        ON food_listings(provider_id, quantity)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_food_location_qty
+        ON food_listings(location, quantity)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_food_type
+        ON food_listings(food_type)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_claims_receiver
+        ON claims(receiver_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_claims_timestamp
+        ON claims(timestamp)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_claims_status
+        ON claims(status)
+    """)
+
+
+_ISO_DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+
+
+def _migrate_iso_dates(cursor):
+    # Rewrite CSV-style expiry dates ('3/17/2025') and claim timestamps
+    # ('3/5/2025 5:26', or datetime.now() strings with microseconds)
+    # into the canonical ISO formats.
+    cursor.execute(f"""
+        SELECT food_id, expiry_date FROM food_listings
+        WHERE expiry_date NOT GLOB '{_ISO_DATE_GLOB}'
+    """)
+    cursor.executemany(
+        "UPDATE food_listings SET expiry_date = ? WHERE food_id = ?",
+        [(to_iso_date(value), food_id) for food_id, value in cursor.fetchall()]
+    )
+
+    cursor.execute(f"""
+        SELECT claim_id, timestamp FROM claims
+        WHERE timestamp IS NOT NULL
+          AND (timestamp NOT GLOB '{_ISO_DATE_GLOB} [0-9][0-9]:[0-9][0-9]:[0-9][0-9]'
+               OR LENGTH(timestamp) != 19)
+    """)
+    cursor.executemany(
+        "UPDATE claims SET timestamp = ? WHERE claim_id = ?",
+        [(to_iso_timestamp(value), claim_id)
+         for claim_id, value in cursor.fetchall()]
+    )
+
+
+def _migrate_ingest_watermarks(cursor):
+    # Per-file ingestion state for incremental CSV loads.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_watermarks (
+            file_path TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            max_id INTEGER,
+            byte_offset INTEGER NOT NULL,
+            file_size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Last ingested content hash of every CSV row, used to tell
+    # changed rows from unchanged ones.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_row_hashes (
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            row_hash INTEGER NOT NULL,
+            PRIMARY KEY (table_name, row_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migrate_summary_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS summary_city (
+            location TEXT PRIMARY KEY,
+            total_quantity INTEGER NOT NULL DEFAULT 0,
+            listing_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS summary_food_type (
+            food_type TEXT PRIMARY KEY,
+            listing_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS summary_claim_status (
+            status TEXT PRIMARY KEY,
+            claim_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    # day is '' for claims without a parseable timestamp.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS summary_claims_daily (
+            day TEXT PRIMARY KEY,
+            claim_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+
+    for trigger in SUMMARY_TRIGGERS:
+        cursor.execute(trigger)
+
+    rebuild_summaries(cursor)
+
+
+def _migrate_claim_units(cursor):
+    cursor.execute("PRAGMA table_info(claims)")
+    if "units" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("""
+            ALTER TABLE claims
+            ADD COLUMN units INTEGER NOT NULL DEFAULT 1 CHECK(units > 0)
+        """)
+
+
+def _migrate_active_listings(cursor):
+    cursor.execute("PRAGMA table_info(food_listings)")
+    if "expired_at" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE food_listings ADD COLUMN expired_at TEXT")
+
+    # Discovery indexes now only hold live inventory: in stock and not
+    # yet retired by the expiry sweeper.
+    cursor.execute("DROP INDEX IF EXISTS idx_food_city_expiry")
+    cursor.execute("DROP INDEX IF EXISTS idx_food_available_expiry")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_food_active_city_expiry
+        ON food_listings(location COLLATE NOCASE, expiry_date)
+        WHERE quantity > 0 AND expired_at IS NULL
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_food_active_expiry
+        ON food_listings(expiry_date)
+        WHERE quantity > 0 AND expired_at IS NULL
+    """)
+
+
+def _migrate_city_gazetteer(cursor):
+    # City coordinates plus their grid cell (see src/geo.py).
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS city_gazetteer (
+            city TEXT PRIMARY KEY COLLATE NOCASE,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            cell_lat INTEGER NOT NULL,
+            cell_lon INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_gazetteer_cell
+        ON city_gazetteer(cell_lat, cell_lon, latitude, longitude)
+    """)
+
+
+def _fts_sync_triggers(fts, table, key, columns):
+    names = ", ".join(columns)
+    new_values = ", ".join(f"NEW.{col}" for col in columns)
+    old_values = ", ".join(f"OLD.{col}" for col in columns)
+    delete = f"""
+        INSERT INTO {fts} ({fts}, rowid, {names})
+        VALUES ('delete', OLD.{key}, {old_values});
+    """
+    insert = f"""
+        INSERT INTO {fts} (rowid, {names})
+        VALUES (NEW.{key}, {new_values});
+    """
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert
+            AFTER INSERT ON {table} BEGIN {insert} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete
+            AFTER DELETE ON {table} BEGIN {delete} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{fts}_update
+            AFTER UPDATE OF {names} ON {table} BEGIN {delete} {insert} END""",
+    ]
+
+
+def _migrate_full_text_search(cursor):
+    # External-content FTS5 indexes: the text lives only in the base
+    # tables, triggers keep the inverted indexes in sync. Quantity
+    # updates (claims) don't touch the indexed columns, so they never
+    # fire the FTS triggers.
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS food_fts USING fts5(
+            food_name, location,
+            content='food_listings', content_rowid='food_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS provider_fts USING fts5(
+            name, address, city,
+            content='providers', content_rowid='provider_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    # Term dictionaries, used for typo-tolerant query rewriting.
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS food_fts_vocab
+        USING fts5vocab(food_fts, 'row')
+    """)
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS provider_fts_vocab
+        USING fts5vocab(provider_fts, 'row')
+    """)
+
+    for trigger in (
+        _fts_sync_triggers("food_fts", "food_listings", "food_id",
+                           ["food_name", "location"])
+        + _fts_sync_triggers("provider_fts", "providers", "provider_id",
+                             ["name", "address", "city"])
+    ):
+        cursor.execute(trigger)
+
+    cursor.execute("INSERT INTO food_fts (food_fts) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO provider_fts (provider_fts) VALUES ('rebuild')")
+
+
+def _migrate_timeseries_rollups(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS timeseries_claims (
+            resolution TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            status TEXT NOT NULL,
+            claim_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (resolution, bucket, status)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS timeseries_listings (
+            resolution TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            quantity_posted INTEGER NOT NULL DEFAULT 0,
+            listings_posted INTEGER NOT NULL DEFAULT 0,
+            quantity_expired INTEGER NOT NULL DEFAULT 0,
+            listings_expired INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (resolution, bucket)
+        ) WITHOUT ROWID
+    """)
+    # position is an id or a timestamp depending on the source.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS timeseries_watermarks (
+            source TEXT PRIMARY KEY,
+            position
+        )
+    """)
+    # Lets each refresh find newly expired listings without a scan.
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_food_expired_at
+        ON food_listings(expired_at)
+        WHERE expired_at IS NOT NULL
+    """)
+    rebuild_timeseries(cursor)
+
+
+def _migrate_search_index_version(cursor):
+    # Bumped by triggers whenever indexed text changes, so the search
+    # vocabulary is re-read after new listings / providers only, not
+    # after every claim.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS search_index_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor.execute(
+        "INSERT OR IGNORE INTO search_index_version (id, version) VALUES (1, 0)"
+    )
+    bump = "UPDATE search_index_version SET version = version + 1 WHERE id = 1;"
+    for table, columns in (
+        ("food_listings", "food_name, location"),
+        ("providers", "name, address, city"),
+    ):
+        for event in ("INSERT", "DELETE", f"UPDATE OF {columns}"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.split()[0].lower()}_search_version
+                AFTER {event} ON {table} BEGIN {bump} END
+            """)
+
+
+MIGRATIONS = [
+    (1, "hot path indexes", _migrate_hot_path_indexes),
+    (2, "ISO-8601 expiry dates and claim timestamps", _migrate_iso_dates),
+    (3, "incremental ingestion watermarks", _migrate_ingest_watermarks),
+    (4, "trigger-maintained summary tables", _migrate_summary_tables),
+    (5, "multi-unit claims", _migrate_claim_units),
+    (6, "expired listings flag and active-listing indexes", _migrate_active_listings),
+    (7, "city gazetteer with grid index", _migrate_city_gazetteer),
+    (8, "FTS5 search over food and providers", _migrate_full_text_search),
+    (9, "hour/day/week/month time-series rollups", _migrate_timeseries_rollups),
+    (10, "search index version counter", _migrate_search_index_version),
+]
+
+
+def get_schema_version(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def _stored_schema_version(conn):
+    # Read-only variant of get_schema_version(): 0 on a fresh database.
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def run_migrations(conn=None):
+    """
+    Applies all pending migrations in order.
+    Returns the list of versions applied by this call.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+
+    applied = []
+    try:
+        current = get_schema_version(conn)
+        for version, description, migrate in sorted(MIGRATIONS):
+            if version <= current:
+                continue
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-check under the write lock: another process may have
+                # applied this version while we were waiting.
+                cursor.execute(
+                    "SELECT 1 FROM schema_version WHERE version = ?",
+                    (version,)
+                )
+                if cursor.fetchone() is None:
+                    migrate(cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_version (version, description) "
+                        "VALUES (?, ?)",
+                        (version, description)
+                    )
+                    applied.append(version)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+    finally:
+        if own_conn:
+            conn.close()
+
+    return applied
+
+
+# =========================================================
+# QUERY PLANS
+# =========================================================
+
+def explain_query_plan(conn, sql, params=()):
+    """
+    Returns the EXPLAIN QUERY PLAN detail lines for a statement.
+    """
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def full_table_scans(plan, allowed=()):
+    """
+    Returns the plan lines that read a table without any index
+    (e.g. "SCAN food_listings"). Covering-index scans, virtual table
+    (FTS) index lookups, scans of materialized subqueries / CTEs and
+    scans of `allowed` tables (e.g. the small summary tables) are not
+    counted.
+    """
+    derived = {
+        line.split(" ", 1)[1]
+        for line in plan
+        if line.startswith(("MATERIALIZE ", "CO-ROUTINE "))
+    }
+    derived.update(allowed)
+    return [
+        line for line in plan
+        if line.startswith("SCAN ")
+        and " USING " not in line
+        and " VIRTUAL TABLE INDEX " not in line
+        and line.split(" ", 1)[1] not in derived
+    ]
 
 
 # =========================================================
 # DATABASE INITIALIZER
 # =========================================================
 
-def initialize_database():
+LATEST_SCHEMA_VERSION = max(version for version, _, _ in MIGRATIONS)
+
+# Database path initialize_database() last brought up to date in this
+# process; later calls for the same path return without touching SQLite.
+_initialized_path = None
+_initialize_lock = threading.Lock()
+
+
+def initialize_database(force=False):
     """
-    Initializes all database tables.
+    Initializes all database tables and applies pending migrations.
     Safe to call multiple times (idempotent).
+
+    Runs once per process and database path, on a single connection:
+    when the stored schema version is already current the CREATE TABLE
+    statements are skipped as well. force=True re-checks anyway.
+    Returns the migration versions applied by this call.
     """
-    create_users_table()
-    create_providers_table()
-    create_receivers_table()
-    create_food_listings_table()
-    create_claims_table()
+    global _initialized_path
+    if _initialized_path == DB_PATH and not force:
+        return []
+
+    with _initialize_lock:
+        if _initialized_path == DB_PATH and not force:
+            return []
+        path = DB_PATH
+        conn = get_connection()
+        try:
+            applied = []
+            if _stored_schema_version(conn) < LATEST_SCHEMA_VERSION:
+                create_users_table(conn)
+                create_providers_table(conn)
+                create_receivers_table(conn)
+                create_food_listings_table(conn)
+                create_claims_table(conn)
+                applied = run_migrations(conn)
+        finally:
+            conn.close()
+        _initialized_path = path
+    return applied
+
+
+# =========================================================
+# CLI
+# =========================================================
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    conn = get_connection()
+
+    if command == "migrate":
+        initialize_database()
+        print(f"✅ Schema at version {get_schema_version(conn)}")
+    elif command == "rebuild-summaries":
+        with conn:
+            rebuild_summaries(conn.cursor())
+        print("✅ Summary tables rebuilt")
+    elif command == "rebuild-timeseries":
+        with conn:
+            rebuild_timeseries(conn.cursor())
+        print("✅ Time-series rollups rebuilt")
+    elif command == "verify-summaries":
+        mismatches = verify_summaries(conn)
+        for table in mismatches:
+            print(f"❌ {table} is out of sync (run rebuild-summaries)")
+        if not mismatches:
+            print("✅ Summary tables match base tables")
+        conn.close()
+        sys.exit(1 if mismatches else 0)
+    elif command in ("grant-admin", "revoke-admin") and len(sys.argv) == 3:
+        # Admins see the Query Stats page; users sign up as 'user'.
+        username = sys.argv[2]
+        role = "admin" if command == "grant-admin" else "user"
+        with conn:
+            updated = conn.execute(
+                "UPDATE users SET role = ? WHERE username = ?", (role, username)
+            ).rowcount
+        conn.close()
+        if not updated:
+            print(f"❌ No user named {username!r} (sign up in the app first)")
+            sys.exit(1)
+        print(f"✅ {username} is now {'an admin' if role == 'admin' else 'a regular user'}")
+        sys.exit(0)
+    else:
+        print("Usage: python -m src.db [migrate | rebuild-summaries | "
+              "rebuild-timeseries | verify-summaries | "
+              "grant-admin USERNAME | revoke-admin USERNAME]")
+        sys.exit(2)
+
+    conn.close()
@@ -0,0 +1,137 @@
+import threading
+import time
+from datetime import datetime
+
+from src import queries
+from src.db import pooled_connection, DATE_FORMAT, TIMESTAMP_FORMAT
+
+# =========================================================
+# EXPIRY SWEEPER
+# =========================================================
+# Flags listings whose expiry date has passed (expired_at = sweep time)
+# so they drop out of the active-listing indexes used by discovery.
+# Work is done in bounded batches, one short write transaction each,
+# so the sweeper never holds the write lock for long.
+#
+# The background sweeper also folds new claims / listings into the
+# trend rollups (queries.refresh_trends()) every TRENDS_INTERVAL
+# seconds, keeping that write off the page render path.
+
+SWEEP_BATCH_SIZE = 500
+SWEEP_INTERVAL = 300.0
+TRENDS_INTERVAL = 30.0
+
+
+def sweep_expired(batch_size=None, today=None, max_batches=None):
+    """
+    Flags expired, still-active listings in batches.
+    Returns the number of listings flagged.
+    """
+    batch_size = batch_size or SWEEP_BATCH_SIZE
+    today = today or datetime.now().strftime(DATE_FORMAT)
+    flagged = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        expired_at = datetime.now().strftime(TIMESTAMP_FORMAT)
+
+        def work(cursor):
+            cursor.execute("""
+                UPDATE food_listings
+                SET expired_at = ?
+                WHERE food_id IN (
+                    SELECT food_id
+                    FROM food_listings
+                    WHERE quantity > 0
+                      AND expired_at IS NULL
+                      AND expiry_date < ?
+                    ORDER BY expiry_date
+                    LIMIT ?
+                )
+            """, (expired_at, today, batch_size))
+            return cursor.rowcount, True
+
+        count, _ = queries.run_write_transaction(work)
+        if count is None:
+            break
+        flagged += count
+        batches += 1
+        if count < batch_size:
+            break
+
+    if flagged:
+        queries.bump_data_version()
+    return flagged
+
+
+def count_expired_pending(today=None):
+    """
+    Number of active listings past their expiry date (not yet swept).
+    """
+    today = today or datetime.now().strftime(DATE_FORMAT)
+    with pooled_connection() as conn:
+        return conn.execute("""
+            SELECT COUNT(*)
+            FROM food_listings
+            WHERE quantity > 0
+              AND expired_at IS NULL
+              AND expiry_date < ?
+        """, (today,)).fetchone()[0]
+
+
+# =========================================================
+# BACKGROUND SWEEPER
+# =========================================================
+
+class ExpirySweeper(threading.Thread):
+    """
+    Daemon thread that runs sweep_expired() every `interval` seconds
+    and queries.refresh_trends() every `trends_interval` seconds.
+    """
+
+    def __init__(self, interval=None, batch_size=None, trends_interval=None):
+        super().__init__(name="expiry-sweeper", daemon=True)
+        self.interval = interval or SWEEP_INTERVAL
+        self.trends_interval = trends_interval or TRENDS_INTERVAL
+        self.batch_size = batch_size
+        self.last_run = None
+        self.last_flagged = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        next_sweep = time.monotonic()
+        while not self._stop_event.is_set():
+            if time.monotonic() >= next_sweep:
+                try:
+                    self.last_flagged = sweep_expired(self.batch_size)
+                except Exception as e:
+                    print(f"⚠️ Expiry sweep failed: {e}")
+                self.last_run = time.time()
+                next_sweep = time.monotonic() + self.interval
+            try:
+                queries.refresh_trends()
+            except Exception as e:
+                print(f"⚠️ Trend refresh failed: {e}")
+            self._stop_event.wait(
+                max(0.0, min(self.trends_interval, next_sweep - time.monotonic()))
+            )
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def start_background_sweeper(interval=None, batch_size=None, trends_interval=None):
+    """
+    Starts the in-process sweeper once per process; later calls return
+    the running instance.
+    """
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = ExpirySweeper(interval, batch_size, trends_interval)
+            _sweeper.start()
+        return _sweeper
@@ -0,0 +1,126 @@
+from src.cache import TTLCache, MISSING
+
+# =========================================================
+# FIGURE CACHE
+# =========================================================
+# Home page charts, built once per distinct query result and shared by
+# every session in the process. Entries are keyed on (chart, result
+# rows, chart options), so a figure is reused until the data it plots
+# actually changes, whatever bumped the data version, and a changed
+# result simply misses. Only the figure is kept: st.plotly_chart()
+# serializes whatever it is given, so a JSON copy would be unused work.
+#
+# Cached figures are shared: treat them as read-only.
+
+FIGURE_CACHE_MAX_ENTRIES = 64
+
+CLAIM_STATUS_COLORS = {
+    "Completed": "#22c55e",
+    "Pending": "#facc15",
+    "Cancelled": "#ef4444",
+}
+
+_figure_cache = TTLCache(max_entries=FIGURE_CACHE_MAX_ENTRIES, ttl=None)
+
+
+def cached_figure(name, rows, build, *options):
+    """
+    Returns build(rows, *options), building it only the first time
+    these rows are plotted.
+    """
+    rows = tuple(tuple(row) for row in rows)
+    key = (name, rows, options)
+    figure = _figure_cache.get(key)
+    if figure is MISSING:
+        figure = build(rows, *options)
+        _figure_cache.set(key, figure)
+    return figure
+
+
+def figure_cache_stats():
+    return _figure_cache.stats()
+
+
+def clear_figure_cache():
+    _figure_cache.clear()
+
+
+# =========================================================
+# HOME PAGE CHARTS
+# =========================================================
+
+def _build_food_types(rows):
+    import pandas as pd
+    import plotly.express as px
+
+    return px.bar(
+        pd.DataFrame(rows, columns=["Food Type", "Count"]),
+        x="Food Type",
+        y="Count",
+        color="Food Type",
+        color_discrete_sequence=px.colors.qualitative.Set2,
+        title="Food Type Distribution"
+    )
+
+
+def _build_claim_status(rows):
+    import pandas as pd
+    import plotly.express as px
+
+    return px.pie(
+        pd.DataFrame(rows, columns=["Status", "Percentage"]),
+        names="Status",
+        values="Percentage",
+        color="Status",
+        color_discrete_map=CLAIM_STATUS_COLORS,
+        title="Claim Status Distribution"
+    )
+
+
+def _build_top_receivers(rows):
+    import pandas as pd
+    import plotly.express as px
+
+    return px.bar(
+        pd.DataFrame(rows, columns=["Receiver", "Claims"]),
+        x="Receiver",
+        y="Claims",
+        color_discrete_sequence=["#2563eb"],
+        title="Top Receivers"
+    )
+
+
+def _build_claims_trend(rows, resolution):
+    import pandas as pd
+    import plotly.express as px
+
+    return px.line(
+        pd.DataFrame(rows, columns=["Date", "Claims"]),
+        x="Date",
+        y="Claims",
+        markers=True,
+        line_shape="spline",
+        color_discrete_sequence=["#0ea5e9"],
+        title=f"Claims Over Time (per {resolution})"
+    )
+
+
+def food_types_chart(food_types):
+    return cached_figure("food_types", food_types, _build_food_types)
+
+
+def claim_status_chart(claim_status):
+    return cached_figure("claim_status", claim_status, _build_claim_status)
+
+
+def top_receivers_chart(top_receivers):
+    return cached_figure("top_receivers", top_receivers, _build_top_receivers)
+
+
+def claims_trend_chart(series):
+    """
+    series: a queries.TimeSeries.
+    """
+    return cached_figure(
+        "claims_trend", series.points, _build_claims_trend, series.resolution
+    )
@@ -0,0 +1,43 @@
+import math
+
+# =========================================================
+# GEO HELPERS
+# =========================================================
+# Cities are bucketed into a fixed lat/lon grid (city_gazetteer.cell_lat /
+# cell_lon, indexed). A radius search only visits the cells overlapping
+# the search circle's bounding box, then filters by exact distance.
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+GRID_CELL_DEGREES = 0.5
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def grid_cell(lat, lon):
+    return (
+        math.floor(lat / GRID_CELL_DEGREES),
+        math.floor(lon / GRID_CELL_DEGREES),
+    )
+
+
+def cell_range(lat, lon, radius_km):
+    """
+    Returns ((min_cell_lat, max_cell_lat), (min_cell_lon, max_cell_lon))
+    covering every point within radius_km of (lat, lon).
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 89.9)))
+    dlon = min(180.0, radius_km / (KM_PER_DEGREE_LAT * max(cos_lat, 1e-6)))
+
+    low = grid_cell(max(lat - dlat, -90.0), lon - dlon)
+    high = grid_cell(min(lat + dlat, 90.0), lon + dlon)
+    return (low[0], high[0]), (low[1], high[1])
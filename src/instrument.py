@@ -0,0 +1,306 @@
+import bisect
+import functools
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from src import db
+
+# =========================================================
+# QUERY INSTRUMENTATION
+# =========================================================
+# Per-function latency histograms, rows returned and pool acquire
+# time, plus a slow-query log with the EXPLAIN QUERY PLAN of every
+# SELECT the slow call ran. Off by default: while disabled,
+# @instrumented costs one flag check per call and no pool hooks are
+# installed.
+
+SLOW_QUERY_MS = 250.0
+SLOW_LOG_SIZE = 100
+
+# Histogram bucket upper bounds (ms); one extra bucket catches the rest.
+LATENCY_BUCKETS_MS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000,
+)
+
+logger = logging.getLogger(__name__)
+
+_enabled = False
+_slow_query_ms = SLOW_QUERY_MS
+_started_at = None
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram (milliseconds).
+    Percentiles are reported as the upper bound of their bucket.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self):
+        labels = [f"<={b}" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"]
+        return {
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "max_ms": self.max_ms,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "buckets": {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+class _FunctionStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.rows = 0
+        self.max_rows = 0
+        self.acquire_ms = 0.0
+
+    def to_dict(self):
+        return dict(
+            self.latency.to_dict(),
+            errors=self.errors,
+            rows=self.rows,
+            max_rows=self.max_rows,
+            acquire_ms=self.acquire_ms,
+        )
+
+
+class _Call:
+    __slots__ = ("acquire_seconds", "statements")
+
+    def __init__(self):
+        self.acquire_seconds = 0.0
+        self.statements = []
+
+
+_functions = {}
+_acquire = Histogram()
+_slow_log = deque(maxlen=SLOW_LOG_SIZE)
+
+
+# =========================================================
+# SWITCHES
+# =========================================================
+
+def enable(slow_query_ms=None):
+    """
+    Starts recording. slow_query_ms overrides the slow-query threshold.
+    """
+    global _enabled, _slow_query_ms, _started_at
+    if slow_query_ms is not None:
+        _slow_query_ms = float(slow_query_ms)
+    if _started_at is None:
+        _started_at = datetime.now().isoformat(timespec="seconds")
+    db.set_pool_hooks(_on_acquire, _on_statement)
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    db.set_pool_hooks(None, None)
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """
+    Clears all recorded stats and the slow-query log.
+    """
+    global _acquire, _started_at
+    with _lock:
+        _functions.clear()
+        _acquire = Histogram()
+        _slow_log.clear()
+        _started_at = datetime.now().isoformat(timespec="seconds") if _enabled else None
+
+
+# =========================================================
+# RECORDING
+# =========================================================
+
+def _active_calls():
+    calls = getattr(_local, "calls", None)
+    if calls is None:
+        calls = _local.calls = []
+    return calls
+
+
+def _on_acquire(seconds):
+    with _lock:
+        _acquire.add(seconds * 1000)
+    for call in _active_calls():
+        call.acquire_seconds += seconds
+
+
+def _on_statement(sql):
+    calls = getattr(_local, "calls", None)
+    if calls and not sql.startswith("EXPLAIN"):
+        for call in calls:
+            call.statements.append(sql)
+
+
+def row_count(result):
+    """
+    Rows in a query result: lists, (rows, next_cursor) pages and single
+    rows (or None). Returns None for scalars and result objects.
+    """
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        if len(result) == 2 and isinstance(result[0], list):
+            return len(result[0])
+        return 1
+    if result is None:
+        return 0
+    return None
+
+
+def _explain(statements):
+    plans, seen = [], set()
+    with db.pooled_connection() as conn:
+        for sql in statements:
+            if sql in seen or not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            seen.add(sql)
+            try:
+                plan = db.explain_query_plan(conn, sql)
+            except sqlite3.Error as e:
+                plan = [f"EXPLAIN failed: {e}"]
+            plans.append({"sql": sql.strip(), "plan": plan})
+    return plans
+
+
+def _record(name, seconds, call, rows, failed, log_sql):
+    ms = seconds * 1000
+    with _lock:
+        stats = _functions.get(name)
+        if stats is None:
+            stats = _functions[name] = _FunctionStats()
+        stats.latency.add(ms)
+        stats.acquire_ms += call.acquire_seconds * 1000
+        if failed:
+            stats.errors += 1
+        if rows:
+            stats.rows += rows
+            stats.max_rows = max(stats.max_rows, rows)
+
+    if ms < _slow_query_ms:
+        return
+    entry = {
+        "function": name,
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "ms": ms,
+        "rows": rows,
+        "acquire_ms": call.acquire_seconds * 1000,
+        "failed": failed,
+        "statements": _explain(call.statements) if log_sql else [],
+    }
+    with _lock:
+        _slow_log.append(entry)
+    logger.warning("Slow query: %s took %.1f ms (%s rows)", name, ms, rows)
+
+
+def instrumented(func=None, *, log_sql=True):
+    """
+    Records latency, rows returned and connection-acquire time for a
+    query function while instrumentation is enabled.
+
+    log_sql=False keeps the function's SQL (with bound values, e.g.
+    passwords) out of the slow-query log:
+
+        @instrumented(log_sql=False)
+        def authenticate_user(...): ...
+    """
+    if func is None:
+        return functools.partial(instrumented, log_sql=log_sql)
+
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+
+        calls = _active_calls()
+        call = _Call()
+        calls.append(call)
+        failed = True
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            calls.pop()
+            _record(name, elapsed, call,
+                    None if failed else row_count(result), failed, log_sql)
+
+    return wrapper
+
+
+# =========================================================
+# REPORTING
+# =========================================================
+
+def snapshot():
+    """
+    Returns all recorded stats as a JSON-serializable dict.
+    """
+    with _lock:
+        return {
+            "enabled": _enabled,
+            "since": _started_at,
+            "slow_query_ms": _slow_query_ms,
+            "functions": {
+                name: stats.to_dict() for name, stats in sorted(_functions.items())
+            },
+            "pool_acquire": _acquire.to_dict(),
+            "slow_queries": list(_slow_log),
+        }
+
+
+def dump_json(path=None, indent=2):
+    """
+    Serializes snapshot() to JSON; also writes it to `path` if given.
+    """
+    text = json.dumps(snapshot(), indent=indent)
+    if path:
+        with open(path, "w") as f:
+            f.write(text)
+    return text
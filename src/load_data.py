@@ -1,38 +1,373 @@
+import hashlib
+import io
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
 import pandas as pd
-from src.db import get_connection, initialize_database
+from src.db import (
+    get_connection, initialize_database, drop_triggers, restore_triggers,
+    DATE_FORMAT, TIMESTAMP_FORMAT, CSV_DATE_FORMAT, CSV_TIMESTAMP_FORMAT,
+    SYNCHRONOUS, CACHE_SIZE_KB
+)
+from src.geo import GRID_CELL_DEGREES
 
 # =========================================================
-# LOAD PROVIDERS (CSV → providers)
+# BULK LOAD CONFIG
+# =========================================================
+
+# Rows read from a CSV (and committed) per chunk. Bounds memory use
+# regardless of file size.
+CHUNK_SIZE = 50_000
+
+# Page cache used while loading (KiB).
+LOAD_CACHE_SIZE_KB = 256 * 1024
+
+# Read size used when hashing CSV files for watermarks.
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Conflicting ids kept in the load stats (and printed) per file.
+CONFLICT_SAMPLE_SIZE = 10
+
+# Appended tails at least this large are loaded like full loads: with
+# the table's triggers dropped and their derived data rebuilt once.
+DEFER_TRIGGERS_MIN_BYTES = 1024 * 1024
+
+
+# =========================================================
+# BULK LOAD HELPERS
 # =========================================================
 
-def load_providers():
-    df = pd.read_csv("data/providers_data.csv")
+@contextmanager
+def _bulk_load_pragmas(conn):
+    """
+    Relaxes durability for the duration of a bulk load: no fsync per
+    commit, temp b-trees in memory and a large page cache.
+    A crash mid-load only loses the load itself, which is re-runnable.
+    """
+    conn.execute("PRAGMA synchronous = OFF;")
+    conn.execute("PRAGMA temp_store = MEMORY;")
+    conn.execute(f"PRAGMA cache_size = {-LOAD_CACHE_SIZE_KB};")
+    try:
+        yield conn
+    finally:
+        conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS};")
+        conn.execute("PRAGMA temp_store = DEFAULT;")
+        conn.execute(f"PRAGMA cache_size = {-CACHE_SIZE_KB};")
+
+
+@contextmanager
+def _write_transaction(conn):
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
+
+
+@contextmanager
+def _deferred_triggers(conn, table):
+    """
+    Runs the whole load in one write transaction with the table's
+    triggers dropped; summaries and the FTS index are rebuilt once
+    before commit. Any error rolls everything back, triggers included.
+    """
+    with _write_transaction(conn):
+        cursor = conn.cursor()
+        triggers = drop_triggers(cursor, table)
+        yield conn
+        restore_triggers(cursor, table, triggers)
+
+
+def _column_values(series):
+    """
+    Converts a column to a list of plain Python values (NaN → None)
+    that sqlite3 can bind.
+    """
+    if series.isna().any():
+        series = series.astype(object).where(series.notna(), None)
+    return series.tolist()
+
+
+def _rows(df):
+    return list(zip(*(_column_values(df[col]) for col in df.columns)))
+
+
+def _sha256_range(path, start, end, hasher):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(HASH_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def _complete_rows_end(path, size):
+    """
+    Byte offset just past the last newline, so a watermark always sits
+    on a row boundary even if the file is being appended to.
+    """
+    with open(path, "rb") as f:
+        pos = size
+        while pos > 0:
+            step = min(HASH_BLOCK_SIZE, pos)
+            f.seek(pos - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline != -1:
+                return pos - step + newline + 1
+            pos -= step
+    return 0
+
+
+class _ByteRange(io.RawIOBase):
+    """
+    Read-only view of bytes [start, end) of an open binary file.
+    """
+
+    def __init__(self, f, start, end):
+        f.seek(start)
+        self._f = f
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._f.read(min(len(buffer), self._remaining))
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+
+def _read_csv_chunks(f, start, end, header, chunk_size):
+    # Only complete rows (up to `end`) are read: a row still being
+    # appended is left for the next run.
+    # Everything is read as text; _prepare_* functions cast explicitly so
+    # dtypes (and therefore row hashes) don't depend on chunk contents.
+    rows = io.BufferedReader(_ByteRange(f, start, end), HASH_BLOCK_SIZE)
+    if start == 0:
+        return pd.read_csv(rows, dtype=str, chunksize=chunk_size)
+    return pd.read_csv(
+        rows, header=None, names=header, dtype=str, chunksize=chunk_size
+    )
+
+
+def _ingest_csv(csv_path, table, key, columns, prepare, chunk_size=None,
+                live_columns=()):
+    """
+    Incrementally loads a CSV into `table`.
+
+    A per-file watermark (byte offset, content hash, max id) decides how
+    much of the file to read:
+    - size and mtime unchanged        → nothing is read
+    - previously ingested bytes intact → only the appended tail is read
+    - anything else                    → the whole file is re-read
+    Reading stops after the last newline: an unterminated last line
+    (a row still being written) is picked up by the next run.
 
+    Rows are then compared against their last ingested hash: new ids are
+    inserted, changed rows are upserted, unchanged rows are skipped. Only
+    rows this loader inserted get a hash, so only they are ever updated.
+    An id already taken by a row the loader did not insert is adopted as
+    the baseline when it holds the same values (e.g. loaded before
+    watermarks existed), otherwise it is left alone and counted under
+    "conflicts". live_columns (changed by the app after loading, e.g.
+    quantity as units are claimed) are inserted but never overwritten.
+    Rows are applied with executemany() one chunk at a time. Full loads
+    and tails of DEFER_TRIGGERS_MIN_BYTES or more run as one transaction
+    without per-row triggers (app writes wait for it); smaller appends
+    commit each chunk with the triggers in place.
+    Returns a stats dict.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    file_path = os.path.abspath(csv_path)
+    stat = os.stat(file_path)
+    started = time.perf_counter()
+
+    names = ", ".join(columns)
+    placeholders = ", ".join("?" for _ in columns)
+    compared = [col for col in columns if col not in live_columns]
+    updates = ", ".join(f"{col} = excluded.{col}" for col in compared if col != key)
+    insert_sql = f"INSERT INTO {table} ({names}) VALUES ({placeholders})"
+    existing_sql = f"""
+        SELECT {", ".join(compared)} FROM {table}
+        WHERE {key} IN (SELECT value FROM json_each(?))
+    """
+    upsert_sql = f"""
+        INSERT INTO {table} ({names}) VALUES ({placeholders})
+        ON CONFLICT({key}) DO UPDATE SET {updates}
+    """
+
+    stats = {"table": table, "mode": "full", "rows": 0, "inserted": 0, "updated": 0,
+             "conflicts": 0, "conflict_ids": []}
     conn = get_connection()
-    cursor = conn.cursor()
-
-    for _, row in df.iterrows():
-        cursor.execute("""
-            INSERT OR IGNORE INTO providers (
-                provider_id,
-                name,
-                type,
-                address,
-                city,
-                contact
-            )
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            int(row["Provider_ID"]),
-            row["Name"],
-            row["Type"],
-            row["Address"],
-            row["City"],
-            row["Contact"]
-        ))
-
-    conn.commit()
-    conn.close()
+
+    try:
+        watermark = conn.execute("""
+            SELECT max_id, byte_offset, file_size, mtime_ns, content_hash
+            FROM ingest_watermarks
+            WHERE file_path = ?
+        """, (file_path,)).fetchone()
+
+        hasher = hashlib.sha256()
+        start, max_id = 0, None
+
+        if watermark:
+            max_id, offset, file_size, mtime_ns, content_hash = watermark
+            if file_size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+                stats["mode"] = "unchanged"
+                return _finish_stats(stats, started)
+            if (stat.st_size >= offset
+                    and _sha256_range(file_path, 0, offset, hasher).hexdigest() == content_hash):
+                stats["mode"] = "append"
+                start = offset
+            else:
+                hasher = hashlib.sha256()
+                max_id = None
+
+        end = _complete_rows_end(file_path, stat.st_size)
+        header = pd.read_csv(file_path, nrows=0).columns.tolist()
+        deferred = stats["mode"] == "full" or end - start >= DEFER_TRIGGERS_MIN_BYTES
+
+        with _bulk_load_pragmas(conn), open(file_path, "rb") as f, (
+            _deferred_triggers(conn, table) if deferred else nullcontext()
+        ):
+            chunks = _read_csv_chunks(f, start, end, header, chunk_size) if start < end else []
+            for chunk in chunks:
+                frame = prepare(chunk)
+                if frame.empty:
+                    continue
+
+                ids = frame[key].to_numpy()
+                hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy().view("int64")
+
+                # Write lock up front: ids are checked and inserted
+                # without the app claiming one in between.
+                with nullcontext() if deferred else _write_transaction(conn):
+                    stored = conn.execute("""
+                        SELECT row_id, row_hash
+                        FROM ingest_row_hashes
+                        WHERE table_name = ?
+                          AND row_id IN (SELECT value FROM json_each(?))
+                    """, (table, json.dumps(ids.tolist()))).fetchall()
+
+                    stored_ids = np.array([row[0] for row in stored], dtype="int64")
+                    stored_hashes = np.array([row[1] for row in stored], dtype="int64")
+                    position = pd.Index(stored_ids).get_indexer(ids)
+                    seen = position >= 0
+                    previous = np.where(seen, stored_hashes[position] if len(stored) else 0, 0)
+
+                    new = ~seen
+                    changed = seen & (previous != hashes)
+
+                    # New to this loader but already in the table: adopt
+                    # identical rows, leave everything else untouched.
+                    existing = {
+                        row[compared.index(key)]: row
+                        for row in conn.execute(existing_sql, (json.dumps(ids[new].tolist()),))
+                    }
+                    if existing:
+                        taken = new & np.isin(ids, list(existing))
+                        incoming = dict(zip(ids[taken].tolist(), _rows(frame.loc[taken, compared])))
+                        conflict = np.isin(ids, [
+                            row_id for row_id, row in incoming.items() if existing[row_id] != row
+                        ])
+                        new &= ~taken
+                        adopted = taken & ~conflict
+                        stats["conflicts"] += int(conflict.sum())
+                        sample = CONFLICT_SAMPLE_SIZE - len(stats["conflict_ids"])
+                        stats["conflict_ids"] += ids[conflict].tolist()[:max(sample, 0)]
+                    else:
+                        adopted = np.zeros(len(ids), dtype=bool)
+                    touched = new | changed | adopted
+
+                    conn.executemany(insert_sql, _rows(frame[new]))
+                    stats["inserted"] += int(new.sum())
+                    conn.executemany(upsert_sql, _rows(frame[changed]))
+                    stats["updated"] += int(changed.sum())
+                    conn.executemany("""
+                        INSERT INTO ingest_row_hashes (table_name, row_id, row_hash)
+                        VALUES (?, ?, ?)
+                        ON CONFLICT(table_name, row_id)
+                        DO UPDATE SET row_hash = excluded.row_hash
+                    """, [
+                        (table, row_id, row_hash)
+                        for row_id, row_hash in zip(ids[touched].tolist(), hashes[touched].tolist())
+                    ])
+
+                stats["rows"] += len(frame)
+                chunk_max = int(ids.max())
+                max_id = chunk_max if max_id is None else max(max_id, chunk_max)
+
+        _sha256_range(file_path, start, end, hasher)
+        with conn:
+            conn.execute("""
+                INSERT INTO ingest_watermarks
+                    (file_path, table_name, max_id, byte_offset,
+                     file_size, mtime_ns, content_hash, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(file_path) DO UPDATE SET
+                    table_name = excluded.table_name,
+                    max_id = excluded.max_id,
+                    byte_offset = excluded.byte_offset,
+                    file_size = excluded.file_size,
+                    mtime_ns = excluded.mtime_ns,
+                    content_hash = excluded.content_hash,
+                    updated_at = excluded.updated_at
+            """, (
+                file_path, table, max_id, end,
+                stat.st_size, stat.st_mtime_ns, hasher.hexdigest()
+            ))
+    finally:
+        conn.close()
+
+    return _finish_stats(stats, started)
+
+
+def _finish_stats(stats, started):
+    seconds = time.perf_counter() - started
+    stats["seconds"] = seconds
+    stats["rows_per_sec"] = stats["rows"] / seconds if seconds > 0 else float("inf")
+    print(
+        f"   {stats['table']} ({stats['mode']}): {stats['rows']:,} rows read, "
+        f"{stats['inserted']:,} inserted, {stats['updated']:,} updated "
+        f"in {seconds:.2f}s ({stats['rows_per_sec']:,.0f} rows/s)"
+    )
+    if stats.get("conflicts"):
+        sample = ", ".join(str(row_id) for row_id in stats["conflict_ids"])
+        print(
+            f"⚠️ {stats['table']}: {stats['conflicts']:,} CSV row(s) skipped, their id "
+            f"already belongs to a row created in the app (ids: {sample}"
+            f"{', ...' if stats['conflicts'] > len(stats['conflict_ids']) else ''})"
+        )
+    return stats
+
+
+# =========================================================
+# LOAD PROVIDERS (CSV → providers)
+# =========================================================
+
+def _prepare_providers(df):
+    return pd.DataFrame({
+        "provider_id": df["Provider_ID"].astype("int64"),
+        "name": df["Name"],
+        "type": df["Type"],
+        "address": df["Address"],
+        "city": df["City"],
+        "contact": df["Contact"],
+    })
+
+
+def load_providers(csv_path="data/providers_data.csv", chunk_size=None):
+    return _ingest_csv(
+        csv_path, "providers", "provider_id",
+        ["provider_id", "name", "type", "address", "city", "contact"],
+        _prepare_providers, chunk_size
+    )
 
 
 # =========================================================
@@ -42,120 +377,151 @@ def load_providers():
 # - Live users create their own receiver profiles
 # =========================================================
 
-def load_receivers():
-    df = pd.read_csv("data/receivers_data.csv")
-
-    conn = get_connection()
-    cursor = conn.cursor()
+def _prepare_receivers(df):
+    return pd.DataFrame({
+        "receiver_id": df["Receiver_ID"].astype("int64"),
+        "name": df["Name"],
+        "city": df["City"],
+        "contact": df["Contact"],
+    })
 
-    for _, row in df.iterrows():
-        cursor.execute("""
-            INSERT OR IGNORE INTO receivers (
-                receiver_id,
-                name,
-                city,
-                contact
-            )
-            VALUES (?, ?, ?, ?)
-        """, (
-            int(row["Receiver_ID"]),
-            row["Name"],
-            row["City"],
-            row["Contact"]
-        ))
 
-    conn.commit()
-    conn.close()
+def load_receivers(csv_path="data/receivers_data.csv", chunk_size=None):
+    return _ingest_csv(
+        csv_path, "receivers", "receiver_id",
+        ["receiver_id", "name", "city", "contact"],
+        _prepare_receivers, chunk_size
+    )
 
 
 # =========================================================
 # LOAD FOOD LISTINGS
 # =========================================================
 
-def load_food_listings():
-    df = pd.read_csv("data/food_listings_data.csv")
+def _prepare_food_listings(df):
+    return pd.DataFrame({
+        "food_id": df["Food_ID"].astype("int64"),
+        "food_name": df["Food_Name"],
+        "quantity": df["Quantity"].astype("int64"),
+        "expiry_date": pd.to_datetime(
+            df["Expiry_Date"], format=CSV_DATE_FORMAT
+        ).dt.strftime(DATE_FORMAT),
+        "provider_id": df["Provider_ID"].astype("int64"),
+        "provider_type": df["Provider_Type"],
+        "location": df["Location"],
+        "food_type": df["Food_Type"],
+        "meal_type": df["Meal_Type"],
+    })
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    for _, row in df.iterrows():
-        cursor.execute("""
-            INSERT OR IGNORE INTO food_listings (
-                food_id,
-                food_name,
-                quantity,
-                expiry_date,
-                provider_id,
-                provider_type,
-                location,
-                food_type,
-                meal_type
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            int(row["Food_ID"]),
-            row["Food_Name"],
-            int(row["Quantity"]),
-            row["Expiry_Date"],
-            int(row["Provider_ID"]),
-            row["Provider_Type"],
-            row["Location"],
-            row["Food_Type"],
-            row["Meal_Type"]
-        ))
-
-    conn.commit()
-    conn.close()
+
+def load_food_listings(csv_path="data/food_listings_data.csv", chunk_size=None):
+    return _ingest_csv(
+        csv_path, "food_listings", "food_id",
+        ["food_id", "food_name", "quantity", "expiry_date", "provider_id",
+         "provider_type", "location", "food_type", "meal_type"],
+        _prepare_food_listings, chunk_size,
+        # Claims draw quantity down; a CSV edit must not restock it.
+        live_columns=("quantity",)
+    )
 
 
 # =========================================================
 # LOAD CLAIMS
 # =========================================================
 
-def load_claims():
-    df = pd.read_csv("data/claims_data.csv")
+def _prepare_claims(df):
+    return pd.DataFrame({
+        "claim_id": df["Claim_ID"].astype("int64"),
+        "food_id": df["Food_ID"].astype("int64"),
+        "receiver_id": df["Receiver_ID"].astype("int64"),
+        "status": df["Status"],
+        "timestamp": pd.to_datetime(
+            df["Timestamp"], format=CSV_TIMESTAMP_FORMAT
+        ).dt.strftime(TIMESTAMP_FORMAT),
+    })
 
+
+def load_claims(csv_path="data/claims_data.csv", chunk_size=None):
+    return _ingest_csv(
+        csv_path, "claims", "claim_id",
+        ["claim_id", "food_id", "receiver_id", "status", "timestamp"],
+        _prepare_claims, chunk_size
+    )
+
+
+# =========================================================
+# LOAD CITY GAZETTEER (optional CSV: City, Latitude, Longitude)
+# =========================================================
+
+GAZETTEER_CSV = "data/city_gazetteer.csv"
+
+
+def load_gazetteer(csv_path=GAZETTEER_CSV, chunk_size=None):
+    """
+    Upserts city coordinates (and their grid cells) used by the
+    radius search. Returns load stats.
+    """
+    started = time.perf_counter()
+    stats = {"table": "city_gazetteer", "mode": "upsert", "rows": 0, "inserted": 0, "updated": 0}
     conn = get_connection()
-    cursor = conn.cursor()
 
-    for _, row in df.iterrows():
-        cursor.execute("""
-            INSERT OR IGNORE INTO claims (
-                claim_id,
-                food_id,
-                receiver_id,
-                status,
-                timestamp
-            )
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            int(row["Claim_ID"]),
-            int(row["Food_ID"]),
-            int(row["Receiver_ID"]),
-            row["Status"],
-            row["Timestamp"]
-        ))
+    try:
+        before = conn.execute("SELECT COUNT(*) FROM city_gazetteer").fetchone()[0]
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_size or CHUNK_SIZE):
+            latitude = chunk["Latitude"].astype("float64")
+            longitude = chunk["Longitude"].astype("float64")
+            frame = pd.DataFrame({
+                "city": chunk["City"].astype(str).str.strip(),
+                "latitude": latitude,
+                "longitude": longitude,
+                "cell_lat": np.floor(latitude / GRID_CELL_DEGREES).astype("int64"),
+                "cell_lon": np.floor(longitude / GRID_CELL_DEGREES).astype("int64"),
+            })
+            with conn:
+                conn.executemany("""
+                    INSERT INTO city_gazetteer
+                        (city, latitude, longitude, cell_lat, cell_lon)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(city) DO UPDATE SET
+                        latitude = excluded.latitude,
+                        longitude = excluded.longitude,
+                        cell_lat = excluded.cell_lat,
+                        cell_lon = excluded.cell_lon
+                """, _rows(frame))
+            stats["rows"] += len(frame)
+        after = conn.execute("SELECT COUNT(*) FROM city_gazetteer").fetchone()[0]
+    finally:
+        conn.close()
 
-    conn.commit()
-    conn.close()
+    stats["inserted"] = after - before
+    stats["updated"] = stats["rows"] - stats["inserted"]
+    return _finish_stats(stats, started)
 
 
 # =========================================================
-# MASTER LOADER (RUN ONCE)
+# MASTER LOADER
 # =========================================================
 
 def load_all_data():
     """
     Initializes database and loads demo CSV data.
-    Run ONLY ONCE during initial project setup.
+    Safe to re-run (e.g. from a scheduler): only new or changed CSV rows
+    are applied, and unchanged files are not read at all.
+    Returns per-table load stats (mode, rows, inserted, updated,
+    seconds, rows_per_sec).
     """
     initialize_database()
-    load_providers()
-    load_receivers()
-    load_food_listings()
-    load_claims()
+    stats = [
+        load_providers(),
+        load_receivers(),
+        load_food_listings(),
+        load_claims(),
+    ]
+    if os.path.exists(GAZETTEER_CSV):
+        stats.append(load_gazetteer())
 
     print("✅ Database initialized and demo data loaded successfully")
+    return stats
 
 
 if __name__ == "__main__":
@@ -0,0 +1,397 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from src import queries
+from src.db import pooled_connection, DATE_FORMAT, TIMESTAMP_FORMAT
+from src.geo import EARTH_RADIUS_KM
+
+# =========================================================
+# MATCHING CONFIG
+# =========================================================
+# Allocation runs in two passes:
+# 1. Local: inside every city, listings (soonest expiry first) are
+#    paired with receivers (highest recent demand first).
+# 2. Spillover: supply left over in one city is sent to the nearest
+#    cities that still have unmet demand (needs city_gazetteer
+#    coordinates), within MAX_SPILLOVER_KM.
+# Both passes use one vectorized primitive (_interval_match), so cost is
+# O((listings + receivers) log n) rather than a listings x receivers
+# cost matrix.
+
+DEMAND_LOOKBACK_DAYS = 30
+DEMAND_HORIZON_DAYS = 7
+MIN_UNITS_PER_RECEIVER = 1
+MAX_UNITS_PER_RECEIVER = 20
+MAX_SPILLOVER_KM = 50.0
+
+# City pairs evaluated per block when building spillover distance matrices.
+DISTANCE_BLOCK_SIZE = 2048
+
+
+@dataclass
+class Allocation:
+    """
+    Result of allocate(). `pairs` has one row per (listing, receiver):
+    food_id, receiver_id, units, local, distance_km, days_to_expiry.
+    """
+    pairs: pd.DataFrame
+    supply_units: int = 0
+    demand_units: int = 0
+    stats: dict = field(default_factory=dict)
+
+    @property
+    def allocated_units(self):
+        return int(self.pairs["units"].sum()) if len(self.pairs) else 0
+
+
+# =========================================================
+# INPUTS
+# =========================================================
+
+def load_supply(conn, today=None):
+    """
+    Live listings: food_id, city, quantity, days_to_expiry.
+    """
+    today = today or datetime.now().strftime(DATE_FORMAT)
+    supply = pd.read_sql_query("""
+        SELECT food_id, location AS city, quantity,
+               JULIANDAY(expiry_date) - JULIANDAY(?) AS days_to_expiry
+        FROM food_listings
+        WHERE quantity > 0
+          AND expired_at IS NULL
+          AND expiry_date >= ?
+    """, conn, params=(today, today))
+    supply["days_to_expiry"] = supply["days_to_expiry"].fillna(0.0)
+    return supply
+
+
+def load_demand(conn, today=None, lookback_days=None, horizon_days=None,
+                min_units=None, max_units=None):
+    """
+    Receivers with a demand signal from their claim history:
+    receiver_id, city, recent_units, capacity.
+    capacity = units claimed per day over the lookback window, scaled
+    to the planning horizon and clipped to [min_units, max_units].
+    """
+    lookback_days = lookback_days or DEMAND_LOOKBACK_DAYS
+    horizon_days = horizon_days or DEMAND_HORIZON_DAYS
+    min_units = MIN_UNITS_PER_RECEIVER if min_units is None else min_units
+    max_units = max_units or MAX_UNITS_PER_RECEIVER
+
+    now = datetime.strptime(today, DATE_FORMAT) if today else datetime.now()
+    since = (now - timedelta(days=lookback_days)).strftime(TIMESTAMP_FORMAT)
+
+    demand = pd.read_sql_query("""
+        SELECT r.receiver_id, r.city,
+               COALESCE(c.recent_units, 0) AS recent_units
+        FROM receivers r
+        LEFT JOIN (
+            SELECT receiver_id, SUM(units) AS recent_units
+            FROM claims
+            WHERE timestamp >= ?
+              AND status != 'Cancelled'
+            GROUP BY receiver_id
+        ) c ON c.receiver_id = r.receiver_id
+    """, conn, params=(since,))
+
+    rate = demand["recent_units"].to_numpy(dtype="float64") / lookback_days
+    demand["capacity"] = np.clip(
+        np.ceil(rate * horizon_days), min_units, max_units
+    ).astype("int64")
+    return demand
+
+
+def _city_keys(cities):
+    return cities.fillna("").astype(str).str.strip().str.lower()
+
+
+# =========================================================
+# CORE PRIMITIVE
+# =========================================================
+
+def _interval_match(left_group, left_units, right_group, right_units):
+    """
+    Pairs units of "left" items with units of "right" items inside the
+    same group, in array order (so callers sort by priority first).
+
+    Both sides must be sorted by group id. Each group fills
+    min(left total, right total) units. Every side is laid out as
+    consecutive intervals on one shared axis. The breakpoints of both
+    layouts give the matched segments.
+
+    Returns (left_index, right_index, units) arrays.
+    """
+    left_units = np.asarray(left_units, dtype="int64")
+    right_units = np.asarray(right_units, dtype="int64")
+    if not len(left_units) or not len(right_units):
+        empty = np.array([], dtype="int64")
+        return empty, empty, empty
+
+    groups = np.union1d(left_group, right_group)
+    left_code = np.searchsorted(groups, left_group)
+    right_code = np.searchsorted(groups, right_group)
+
+    left_total = np.bincount(left_code, weights=left_units, minlength=len(groups))
+    right_total = np.bincount(right_code, weights=right_units, minlength=len(groups))
+    capacity = np.minimum(left_total, right_total).astype("int64")
+    base = np.concatenate([[0], np.cumsum(capacity)[:-1]])
+
+    def layout(code, units, total):
+        cum = np.cumsum(units)
+        group_start = np.concatenate([[0], np.cumsum(total.astype("int64"))[:-1]])
+        local_end = cum - group_start[code]
+        return base[code] + np.minimum(local_end, capacity[code])
+
+    left_end = layout(left_code, left_units, left_total)
+    right_end = layout(right_code, right_units, right_total)
+
+    points = np.unique(np.concatenate([left_end, right_end]))
+    points = points[points > 0]
+    starts = np.concatenate([[0], points[:-1]])
+    units = points - starts
+
+    return (
+        np.searchsorted(left_end, points, side="left"),
+        np.searchsorted(right_end, points, side="left"),
+        units,
+    )
+
+
+# =========================================================
+# SPILLOVER
+# =========================================================
+
+def _city_coordinates(conn, cities):
+    coords = pd.read_sql_query("""
+        SELECT LOWER(city) AS city, latitude, longitude
+        FROM city_gazetteer
+    """, conn).drop_duplicates("city").set_index("city")
+    return coords.reindex(cities)
+
+
+def _distance_matrix(lat1, lon1, lat2, lon2):
+    lat1, lon1 = np.radians(lat1)[:, None], np.radians(lon1)[:, None]
+    lat2, lon2 = np.radians(lat2)[None, :], np.radians(lon2)[None, :]
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _spillover_flows(conn, supply_left, demand_left, max_km):
+    """
+    Greedy city-to-city transfer plan for leftover units, nearest pairs
+    first (ties: most urgent supply city first).
+    Returns a DataFrame: from_city, to_city, units, distance_km.
+    """
+    from_cities = supply_left.groupby("city_key").agg(
+        units=("left", "sum"), urgency=("days_to_expiry", "min")
+    )
+    to_cities = demand_left.groupby("city_key").agg(units=("left", "sum"))
+    from_cities = from_cities[from_cities["units"] > 0]
+    to_cities = to_cities[to_cities["units"] > 0]
+    if from_cities.empty or to_cities.empty:
+        return pd.DataFrame(columns=["from_city", "to_city", "units", "distance_km"])
+
+    src = _city_coordinates(conn, from_cities.index).dropna()
+    dst = _city_coordinates(conn, to_cities.index).dropna()
+
+    pairs = []
+    for start in range(0, len(src), DISTANCE_BLOCK_SIZE):
+        block = src.iloc[start:start + DISTANCE_BLOCK_SIZE]
+        dist = _distance_matrix(
+            block["latitude"].to_numpy(), block["longitude"].to_numpy(),
+            dst["latitude"].to_numpy(), dst["longitude"].to_numpy()
+        )
+        i, j = np.nonzero(dist <= max_km)
+        pairs.append(pd.DataFrame({
+            "from_city": block.index.to_numpy()[i],
+            "to_city": dst.index.to_numpy()[j],
+            "distance_km": dist[i, j],
+        }))
+    pairs = pd.concat(pairs, ignore_index=True) if pairs else pd.DataFrame()
+    pairs = pairs[pairs["from_city"] != pairs["to_city"]] if len(pairs) else pairs
+    if pairs.empty:
+        return pd.DataFrame(columns=["from_city", "to_city", "units", "distance_km"])
+
+    pairs["urgency"] = from_cities["urgency"].reindex(pairs["from_city"]).to_numpy()
+    pairs = pairs.sort_values(["distance_km", "urgency"], kind="stable")
+
+    supply_left_units = from_cities["units"].to_dict()
+    demand_left_units = to_cities["units"].to_dict()
+    flows = []
+    for from_city, to_city, distance in zip(
+        pairs["from_city"], pairs["to_city"], pairs["distance_km"]
+    ):
+        units = min(supply_left_units[from_city], demand_left_units[to_city])
+        if units > 0:
+            supply_left_units[from_city] -= units
+            demand_left_units[to_city] -= units
+            flows.append((from_city, to_city, units, distance))
+
+    return pd.DataFrame(flows, columns=["from_city", "to_city", "units", "distance_km"])
+
+
+# =========================================================
+# ALLOCATION
+# =========================================================
+
+def allocate(supply, demand, conn=None, max_spillover_km=None):
+    """
+    Computes an allocation of listing units to receivers.
+
+    supply: DataFrame(food_id, city, quantity, days_to_expiry)
+    demand: DataFrame(receiver_id, city, recent_units, capacity)
+    conn:   connection used to read city_gazetteer for spillover;
+            None disables spillover (local matches only).
+    Returns an Allocation.
+    """
+    max_spillover_km = MAX_SPILLOVER_KM if max_spillover_km is None else max_spillover_km
+
+    supply = supply.assign(city_key=_city_keys(supply["city"]))
+    demand = demand.assign(city_key=_city_keys(demand["city"]))
+    codes, uniques = pd.factorize(
+        pd.concat([supply["city_key"], demand["city_key"]], ignore_index=True)
+    )
+    supply["group"] = codes[:len(supply)]
+    demand["group"] = codes[len(supply):]
+
+    # Priority order inside each city block.
+    supply = supply.sort_values(
+        ["group", "days_to_expiry", "food_id"], kind="stable"
+    ).reset_index(drop=True)
+    demand = demand.sort_values(
+        ["group", "recent_units", "receiver_id"],
+        ascending=[True, False, True], kind="stable"
+    ).reset_index(drop=True)
+
+    # Pass 1: local.
+    li, ri, units = _interval_match(
+        supply["group"].to_numpy(), supply["quantity"].to_numpy(),
+        demand["group"].to_numpy(), demand["capacity"].to_numpy()
+    )
+    local = pd.DataFrame({
+        "food_id": supply["food_id"].to_numpy()[li],
+        "receiver_id": demand["receiver_id"].to_numpy()[ri],
+        "units": units,
+        "local": True,
+        "distance_km": 0.0,
+        "days_to_expiry": supply["days_to_expiry"].to_numpy()[li],
+    })
+    supply["left"] = supply["quantity"].to_numpy() - np.bincount(
+        li, weights=units, minlength=len(supply)
+    ).astype("int64")
+    demand["left"] = demand["capacity"].to_numpy() - np.bincount(
+        ri, weights=units, minlength=len(demand)
+    ).astype("int64")
+
+    results = [local]
+
+    # Pass 2: spillover to nearby cities.
+    if conn is not None and max_spillover_km > 0:
+        flows = _spillover_flows(conn, supply, demand, max_spillover_km)
+        if len(flows):
+            spare = supply[supply["left"] > 0]
+            city_index = pd.Index(uniques)
+
+            # a) split each city's leftover listings across its outgoing flows
+            flows = flows.assign(
+                from_group=city_index.get_indexer(flows["from_city"]),
+                to_group=city_index.get_indexer(flows["to_city"]),
+            ).sort_values(["from_group", "distance_km"], kind="stable").reset_index(drop=True)
+            si, fi, piece_units = _interval_match(
+                spare["group"].to_numpy(), spare["left"].to_numpy(),
+                flows["from_group"].to_numpy(), flows["units"].to_numpy()
+            )
+            pieces = pd.DataFrame({
+                "food_id": spare["food_id"].to_numpy()[si],
+                "days_to_expiry": spare["days_to_expiry"].to_numpy()[si],
+                "group": flows["to_group"].to_numpy()[fi],
+                "distance_km": flows["distance_km"].to_numpy()[fi],
+                "units": piece_units,
+            }).sort_values(["group", "days_to_expiry", "food_id"], kind="stable")
+
+            # b) hand incoming pieces to receivers with unmet demand
+            needy = demand[demand["left"] > 0]
+            pi, ni, units = _interval_match(
+                pieces["group"].to_numpy(), pieces["units"].to_numpy(),
+                needy["group"].to_numpy(), needy["left"].to_numpy()
+            )
+            results.append(pd.DataFrame({
+                "food_id": pieces["food_id"].to_numpy()[pi],
+                "receiver_id": needy["receiver_id"].to_numpy()[ni],
+                "units": units,
+                "local": False,
+                "distance_km": pieces["distance_km"].to_numpy()[pi],
+                "days_to_expiry": pieces["days_to_expiry"].to_numpy()[pi],
+            }))
+
+    pairs = (
+        pd.concat(results, ignore_index=True)
+        .groupby(["food_id", "receiver_id"], as_index=False, sort=False)
+        .agg(units=("units", "sum"), local=("local", "first"),
+             distance_km=("distance_km", "min"),
+             days_to_expiry=("days_to_expiry", "first"))
+    )
+
+    allocation = Allocation(
+        pairs=pairs,
+        supply_units=int(supply["quantity"].sum()),
+        demand_units=int(demand["capacity"].sum()),
+    )
+    allocation.stats = {
+        "listings": len(supply),
+        "receivers": len(demand),
+        "allocated_units": allocation.allocated_units,
+        "local_units": int(pairs.loc[pairs["local"], "units"].sum()),
+        "spillover_units": int(pairs.loc[~pairs["local"], "units"].sum()),
+    }
+    return allocation
+
+
+def plan_allocation(today=None, max_spillover_km=None, **demand_options):
+    """
+    Loads live supply and receiver demand from the database and
+    computes an allocation (nothing is written).
+    """
+    with pooled_connection() as conn:
+        supply = load_supply(conn, today)
+        demand = load_demand(conn, today, **demand_options)
+        return allocate(supply, demand, conn, max_spillover_km)
+
+
+def commit_allocation(allocation, mode=queries.BEST_EFFORT):
+    """
+    Writes an allocation as claims in one batched claim transaction.
+    Listings that changed since planning are reported per item (or roll
+    the whole run back with ALL_OR_NOTHING).
+    Returns a BatchClaimResult.
+    """
+    pairs = allocation.pairs
+    return queries.create_claims_bulk(
+        list(zip(
+            pairs["receiver_id"].tolist(),
+            pairs["food_id"].tolist(),
+            pairs["units"].tolist(),
+        )),
+        mode
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    allocation = plan_allocation()
+    print(
+        f"📦 {allocation.stats['allocated_units']:,} of {allocation.supply_units:,} units "
+        f"allocated to {allocation.pairs['receiver_id'].nunique():,} receivers "
+        f"({allocation.stats['local_units']:,} local, "
+        f"{allocation.stats['spillover_units']:,} spillover)"
+    )
+    if "--commit" in sys.argv:
+        result = commit_allocation(allocation)
+        print(f"✅ Claimed {result.claimed_units:,} units")
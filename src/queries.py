@@ -1,272 +1,1346 @@
-from src.db import get_connection
+from src.db import (
+    pooled_connection, get_pool, explain_query_plan, full_table_scans,
+    to_iso_date, to_iso_timestamp, refresh_timeseries,
+    SUMMARY_TABLES, TIMESERIES_BUCKETS,
+    DATE_FORMAT, TIMESTAMP_FORMAT, CSV_DATE_FORMAT
+)
+from src.analytics import analytics_connection, get_pool as get_analytics_pool
+from src.cache import TTLCache, MISSING
+from src.instrument import instrumented
+from src.geo import haversine_km, cell_range
+from dataclasses import dataclass, field, replace
 from datetime import datetime
+import bisect
+import difflib
+import functools
+import itertools
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+
+# =========================================================
+# QUERY CACHE
+# =========================================================
+# Read queries are memoized per data version. Every write path in this
+# module bumps the version after committing, so cached results are
+# reused until the data actually changes. The TTL bounds staleness for
+# writes made outside this process (e.g. the CSV loader).
+
+CACHE_TTL = 60.0
+CACHE_MAX_ENTRIES = 256
+
+_query_cache = TTLCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+_data_version = 0
+_version_lock = threading.Lock()
+
+
+def data_version():
+    return _data_version
+
+
+def bump_data_version():
+    """
+    Marks all cached query results as stale.
+    """
+    global _data_version
+    with _version_lock:
+        _data_version += 1
+    _query_cache.clear()
+
+
+def _cache_key_part(value):
+    # Lists (e.g. a page cursor back from JSON or session state) are
+    # keyed as tuples so they hash.
+    if isinstance(value, (list, tuple)):
+        return tuple(_cache_key_part(item) for item in value)
+    return value
+
+
+def cached_query(func):
+    """
+    Memoizes a read query on (name, args, data version).
+    The uncached function stays available as func.__wrapped__.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (
+            func.__name__,
+            _cache_key_part(args),
+            tuple(sorted((k, _cache_key_part(v)) for k, v in kwargs.items())),
+            _data_version,
+        )
+        result = _query_cache.get(key)
+        if result is MISSING:
+            result = func(*args, **kwargs)
+            _query_cache.set(key, result)
+        return list(result) if isinstance(result, list) else result
+
+    return wrapper
+
+
+def query_cache_stats():
+    return dict(_query_cache.stats(), data_version=_data_version)
+
 
 # =========================================================
 # AUTHENTICATION
 # =========================================================
 
+@instrumented(log_sql=False)
 def create_user(username, password, role="user"):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            INSERT INTO users (username, password, role)
-            VALUES (?, ?, ?)
-        """, (username, password, role))
-        conn.commit()
-        return True
-    except:
-        return False
-    finally:
-        conn.close()
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO users (username, password, role)
+                VALUES (?, ?, ?)
+            """, (username, password, role))
+            conn.commit()
+            bump_data_version()
+            return True
+        except:
+            return False
 
 
+@instrumented(log_sql=False)
 def authenticate_user(username, password):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT user_id, username, role, linked_id
-        FROM users
-        WHERE username = ? AND password = ?
-    """, (username, password))
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT user_id, username, role, linked_id
+            FROM users
+            WHERE username = ? AND password = ?
+        """, (username, password))
+        return cursor.fetchone()
 
 
 # =========================================================
 # RECEIVER CRUD (USER ↔ RECEIVER LINKED)
 # =========================================================
 
+@instrumented
 def create_receiver(user_id, name, city, contact):
-    conn = get_connection()
-    cursor = conn.cursor()
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        INSERT INTO receivers (name, city, contact)
-        VALUES (?, ?, ?)
-    """, (name, city, contact))
+        cursor.execute("""
+            INSERT INTO receivers (name, city, contact)
+            VALUES (?, ?, ?)
+        """, (name, city, contact))
 
-    receiver_id = cursor.lastrowid
+        receiver_id = cursor.lastrowid
 
-    cursor.execute("""
-        UPDATE users
-        SET linked_id = ?
-        WHERE user_id = ?
-    """, (receiver_id, user_id))
+        cursor.execute("""
+            UPDATE users
+            SET linked_id = ?
+            WHERE user_id = ?
+        """, (receiver_id, user_id))
 
-    conn.commit()
-    conn.close()
+        conn.commit()
+    bump_data_version()
 
 
+@instrumented
 def update_receiver(receiver_id, name, city, contact):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE receivers
-        SET name = ?, city = ?, contact = ?
-        WHERE receiver_id = ?
-    """, (name, city, contact, receiver_id))
-    conn.commit()
-    conn.close()
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE receivers
+            SET name = ?, city = ?, contact = ?
+            WHERE receiver_id = ?
+        """, (name, city, contact, receiver_id))
+        conn.commit()
+    bump_data_version()
 
 
+@instrumented
 def get_receiver_by_user(user_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT r.receiver_id, r.name, r.city, r.contact
-        FROM receivers r
-        JOIN users u ON u.linked_id = r.receiver_id
-        WHERE u.user_id = ?
-    """, (user_id,))
-    data = cursor.fetchone()
-    conn.close()
-    return data
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT r.receiver_id, r.name, r.city, r.contact
+            FROM receivers r
+            JOIN users u ON u.linked_id = r.receiver_id
+            WHERE u.user_id = ?
+        """, (user_id,))
+        return cursor.fetchone()
 
 
 # =========================================================
 # PROVIDER / FOOD LISTINGS (CRUD)
 # =========================================================
 
+@instrumented
 def create_food_listing(
     food_name, quantity, expiry_date,
     provider_id, provider_type,
     location, food_type, meal_type
 ):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO food_listings
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO food_listings
+            (food_name, quantity, expiry_date, provider_id,
+             provider_type, location, food_type, meal_type)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            food_name, quantity, to_iso_date(expiry_date),
+            provider_id, provider_type,
+            location, food_type, meal_type
+        ))
+        conn.commit()
+    bump_data_version()
+
+
+# =========================================================
+# BULK FOOD LISTINGS (PROVIDER UPLOADS)
+# =========================================================
+
+FOOD_TYPES = ["Vegetarian", "Non-Vegetarian", "Vegan"]
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner", "Snacks"]
+
+BULK_LISTING_COLUMNS = [
+    "food_name", "quantity", "expiry_date",
+    "location", "food_type", "meal_type",
+]
+
+# Rows written per transaction by create_food_listings_bulk().
+BULK_LISTING_CHUNK_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class BulkListingResult:
+    inserted: int
+    errors: list                # [(row_number, message)], 1-based data rows
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def _validate_listings(df, provider_type):
+    """
+    Normalizes and validates an upload column-wise.
+    Returns (clean DataFrame of valid rows, [(row_number, message)]).
+    """
+    import pandas as pd
+
+    df = df.rename(columns=lambda col: str(col).strip().lower().replace(" ", "_"))
+    missing = [col for col in BULK_LISTING_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    df = df.reset_index(drop=True)
+    text = {
+        col: df[col].astype("string").str.strip()
+        for col in ("food_name", "location", "food_type", "meal_type")
+    }
+    quantity = pd.to_numeric(df["quantity"], errors="coerce")
+    raw_expiry = df["expiry_date"].astype("string").str.strip()
+    expiry = pd.to_datetime(raw_expiry, format=DATE_FORMAT, errors="coerce").fillna(
+        pd.to_datetime(raw_expiry, format=CSV_DATE_FORMAT, errors="coerce")
+    )
+
+    checks = [
+        (text["food_name"].fillna("") == "", "food_name is required"),
+        (quantity.isna() | (quantity % 1 != 0), "quantity must be a whole number"),
+        (quantity < 1, "quantity must be at least 1"),
+        (expiry.isna(), "expiry_date must be YYYY-MM-DD or M/D/YYYY"),
+        (text["location"].fillna("") == "", "location is required"),
+        (~text["food_type"].isin(FOOD_TYPES).fillna(False),
+         f"food_type must be one of {', '.join(FOOD_TYPES)}"),
+        (~text["meal_type"].isin(MEAL_TYPES).fillna(False),
+         f"meal_type must be one of {', '.join(MEAL_TYPES)}"),
+    ]
+
+    invalid = pd.Series(False, index=df.index)
+    messages = pd.Series("", index=df.index, dtype="string")
+    for mask, message in checks:
+        mask = mask.fillna(False).astype(bool)
+        messages = messages.mask(mask, messages + "; " + message)
+        invalid |= mask
+
+    errors = [
+        (row + 1, message.lstrip("; "))
+        for row, message in messages[invalid].items()
+    ]
+
+    valid = ~invalid
+    if "provider_type" in df.columns:
+        provider_types = df["provider_type"].astype("string").fillna(provider_type)
+    else:
+        provider_types = pd.Series(provider_type, index=df.index, dtype="string")
+
+    clean = pd.DataFrame({
+        "food_name": text["food_name"][valid],
+        "quantity": quantity[valid].astype("int64"),
+        "expiry_date": expiry[valid].dt.strftime(DATE_FORMAT),
+        "provider_type": provider_types[valid],
+        "location": text["location"][valid],
+        "food_type": text["food_type"][valid],
+        "meal_type": text["meal_type"][valid],
+    })
+    return clean, errors
+
+
+@instrumented
+def create_food_listings_bulk(data, provider_id, provider_type="Individual",
+                              chunk_size=None):
+    """
+    Inserts many listings for one provider.
+
+    data: a DataFrame, or a CSV path / file-like object, with columns
+          food_name, quantity, expiry_date, location, food_type,
+          meal_type (optional provider_type).
+    Invalid rows are skipped and reported; valid rows are inserted with
+    executemany() in chunked transactions. A chunk the database rejects
+    (busy, constraint failure) is rolled back and its rows reported;
+    chunks already committed stay, and cached reads are invalidated
+    for them.
+    Returns a BulkListingResult.
+    """
+    import pandas as pd
+
+    df = data if isinstance(data, pd.DataFrame) else pd.read_csv(data, dtype=str)
+    clean, errors = _validate_listings(df, provider_type)
+    chunk_size = chunk_size or BULK_LISTING_CHUNK_SIZE
+
+    rows = [
         (food_name, quantity, expiry_date, provider_id,
-         provider_type, location, food_type, meal_type)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        food_name, quantity, expiry_date,
-        provider_id, provider_type,
-        location, food_type, meal_type
-    ))
-    conn.commit()
-    conn.close()
+         row_provider_type, location, food_type, meal_type)
+        for food_name, quantity, expiry_date, row_provider_type,
+            location, food_type, meal_type
+        in zip(*(clean[col].tolist() for col in clean.columns))
+    ]
+
+    inserted = 0
+    try:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+
+            def work(cursor):
+                cursor.executemany("""
+                    INSERT INTO food_listings
+                    (food_name, quantity, expiry_date, provider_id,
+                     provider_type, location, food_type, meal_type)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, chunk)
+                return len(chunk), True
+
+            try:
+                written, _ = run_write_transaction(work)
+                failure = "Database is busy" if written is None else None
+            except sqlite3.Error as e:
+                failure = f"Database error ({e})"
+            if failure:
+                errors.extend(
+                    (int(index) + 1, f"{failure}, row not saved")
+                    for index in clean.index[start:start + chunk_size]
+                )
+                continue
+            inserted += written
+    finally:
+        if inserted:
+            bump_data_version()
+    return BulkListingResult(inserted, sorted(errors))
 
 
 # =========================================================
 # FOOD DISCOVERY
 # =========================================================
+# Discovery only returns live inventory: in stock, not flagged by the
+# expiry sweeper (src/expiry.py) and not past its expiry date, so it is
+# served from the active-listing partial indexes.
+
+def _today():
+    return datetime.now().strftime(DATE_FORMAT)
+
 
+@cached_query
+@instrumented
 def get_food_by_city(city):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT food_id, food_name, quantity, expiry_date,
-               provider_id, location, food_type, meal_type
-        FROM food_listings
-        WHERE quantity > 0
-          AND LOWER(location) = LOWER(?)
-        ORDER BY expiry_date
-    """, (city,))
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT food_id, food_name, quantity, expiry_date,
+                   provider_id, location, food_type, meal_type
+            FROM food_listings
+            WHERE quantity > 0
+              AND expired_at IS NULL
+              AND location = ? COLLATE NOCASE
+              AND expiry_date >= ?
+            ORDER BY expiry_date
+        """, (city, _today()))
+        return cursor.fetchall()
 
 
+@cached_query
+@instrumented
 def get_available_food():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT food_id, food_name, quantity, location,
-               food_type, meal_type, expiry_date
-        FROM food_listings
-        WHERE quantity > 0
-        ORDER BY expiry_date
-    """)
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT food_id, food_name, quantity, location,
+                   food_type, meal_type, expiry_date
+            FROM food_listings
+            WHERE quantity > 0
+              AND expired_at IS NULL
+              AND expiry_date >= ?
+            ORDER BY expiry_date
+        """, (_today(),))
+        return cursor.fetchall()
+
+
+# =========================================================
+# FOOD DISCOVERY (KEYSET PAGINATION)
+# =========================================================
+# Pages are ordered by (expiry_date, food_id); the cursor is the key of
+# the last row of the previous page, so each page costs O(page_size)
+# no matter how deep the reader pages.
+
+DEFAULT_PAGE_SIZE = 25
+
+
+def _food_page(columns, city, after, page_size, food_type, meal_type, min_quantity):
+    conditions = ["quantity > 0", "expired_at IS NULL", "expiry_date >= ?", "quantity >= ?"]
+    params = [_today(), min_quantity]
+
+    if city is not None:
+        conditions.append("location = ? COLLATE NOCASE")
+        params.append(city)
+    if food_type:
+        conditions.append("food_type = ?")
+        params.append(food_type)
+    if meal_type:
+        conditions.append("meal_type = ?")
+        params.append(meal_type)
+    if after is not None:
+        conditions.append("(expiry_date, food_id) > (?, ?)")
+        params.extend(after)
+
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {columns}
+            FROM food_listings
+            WHERE {" AND ".join(conditions)}
+            ORDER BY expiry_date, food_id
+            LIMIT ?
+        """, (*params, page_size + 1))
+        rows = cursor.fetchall()
+
+    # One extra row tells us whether another page exists.
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return rows, (rows[-1][-2:] if has_more else None)
+
+
+@cached_query
+@instrumented
+def get_food_by_city_page(
+    city, after=None, page_size=DEFAULT_PAGE_SIZE,
+    food_type=None, meal_type=None, min_quantity=1
+):
+    """
+    One page of available food in a city.
+    Returns (rows, next_cursor); rows have the same columns as
+    get_food_by_city(), next_cursor is None on the last page.
+    """
+    rows, next_cursor = _food_page(
+        """food_id, food_name, quantity, expiry_date,
+           provider_id, location, food_type, meal_type,
+           expiry_date, food_id""",
+        city, after, page_size, food_type, meal_type, min_quantity
+    )
+    return [row[:-2] for row in rows], next_cursor
+
+
+@cached_query
+@instrumented
+def get_available_food_page(
+    after=None, page_size=DEFAULT_PAGE_SIZE,
+    food_type=None, meal_type=None, min_quantity=1
+):
+    """
+    One page of available food across all cities.
+    Returns (rows, next_cursor); rows have the same columns as
+    get_available_food(), next_cursor is None on the last page.
+    """
+    rows, next_cursor = _food_page(
+        """food_id, food_name, quantity, location,
+           food_type, meal_type, expiry_date,
+           expiry_date, food_id""",
+        None, after, page_size, food_type, meal_type, min_quantity
+    )
+    return [row[:-2] for row in rows], next_cursor
+
+
+# =========================================================
+# FOOD DISCOVERY (RADIUS SEARCH)
+# =========================================================
+# Listings are located by their city. Nearby cities come from the
+# grid-indexed city_gazetteer; their live listings are then read per
+# city from the active-listing index, nearest city first, stopping as
+# soon as `limit` rows are certain. Cost is O(cities in radius + limit),
+# independent of the total number of listings.
+
+@cached_query
+@instrumented
+def get_food_near(city, radius_km=25, limit=50):
+    """
+    Live listings within radius_km of a city, ordered by distance then
+    expiry. Rows have get_food_by_city() columns plus distance_km.
+    Cities missing from the gazetteer only match themselves (distance 0).
+    """
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT latitude, longitude
+            FROM city_gazetteer
+            WHERE city = ?
+        """, (city,))
+        origin = cursor.fetchone()
+
+        if origin is None:
+            nearby = [(0.0, city)]
+        else:
+            lat, lon = origin
+            (lat_lo, lat_hi), (lon_lo, lon_hi) = cell_range(lat, lon, radius_km)
+            cursor.execute("""
+                SELECT city, latitude, longitude
+                FROM city_gazetteer
+                WHERE cell_lat BETWEEN ? AND ?
+                  AND cell_lon BETWEEN ? AND ?
+            """, (lat_lo, lat_hi, lon_lo, lon_hi))
+            nearby = sorted(
+                (distance, name)
+                for name, city_lat, city_lon in cursor.fetchall()
+                for distance in (haversine_km(lat, lon, city_lat, city_lon),)
+                if distance <= radius_km
+            )
+
+        today = _today()
+        results = []
+        for distance, name in nearby:
+            # Cities further away can only rank after what we already have.
+            if len(results) >= limit and distance > results[limit - 1][-1]:
+                break
+            cursor.execute("""
+                SELECT food_id, food_name, quantity, expiry_date,
+                       provider_id, location, food_type, meal_type
+                FROM food_listings
+                WHERE quantity > 0
+                  AND expired_at IS NULL
+                  AND location = ? COLLATE NOCASE
+                  AND expiry_date >= ?
+                ORDER BY expiry_date
+                LIMIT ?
+            """, (name, today, limit))
+            results.extend(row + (round(distance, 2),) for row in cursor.fetchall())
+            results.sort(key=lambda row: (row[-1], row[3], row[0]))
+            del results[limit:]
+
+    return results
+
+
+# =========================================================
+# FOOD SEARCH (FTS5)
+# =========================================================
+# Free-text search over food names / locations (food_fts) and provider
+# name / address / city (provider_fts). Every query term is matched as
+# a prefix; a term that is not a prefix of any indexed word is widened
+# with its closest indexed word (same first letter, edit-similarity),
+# so "bred" still finds "bread".
+
+SEARCH_TYPO_CUTOFF = 0.75
+SEARCH_TYPO_MATCHES = 1
+
+# A provider tier this large is served by walking live listings in
+# expiry order instead of looking up every provider's listings (a word
+# in every address ties all providers on bm25).
+SEARCH_EXPIRY_WALK_PROVIDERS = 200
+
+# Term dictionary, reloaded only when search_index_version moves
+# (i.e. indexed text changed), not on every data version bump.
+_vocabulary = {"version": None, "terms": ()}
+_vocabulary_lock = threading.Lock()
+
+
+def _search_vocabulary(conn):
+    version = conn.execute(
+        "SELECT version FROM search_index_version WHERE id = 1"
+    ).fetchone()[0]
+    with _vocabulary_lock:
+        if _vocabulary["version"] == version:
+            return _vocabulary["terms"]
+    rows = conn.execute("""
+        SELECT term FROM food_fts_vocab
+        UNION
+        SELECT term FROM provider_fts_vocab
+    """).fetchall()
+    terms = tuple(sorted(row[0] for row in rows))
+    with _vocabulary_lock:
+        _vocabulary.update(version=version, terms=terms)
+    return terms
+
+
+def _has_prefix(vocabulary, term):
+    position = bisect.bisect_left(vocabulary, term)
+    return position < len(vocabulary) and vocabulary[position].startswith(term)
+
+
+def _fts_query(conn, text):
+    """
+    Builds an FTS5 MATCH expression from free text, or None if the text
+    has no searchable words.
+    """
+    terms = re.findall(r"\w+", text.lower())
+    if not terms:
+        return None
+
+    vocabulary = _search_vocabulary(conn)
+    clauses = []
+    for term in terms:
+        options = [f'"{term}"*']
+        if not _has_prefix(vocabulary, term):
+            candidates = [
+                word for word in vocabulary[
+                    bisect.bisect_left(vocabulary, term[0]):
+                    bisect.bisect_left(vocabulary, chr(ord(term[0]) + 1))
+                ]
+                if abs(len(word) - len(term)) <= 2
+            ]
+            options += [
+                f'"{word}"'
+                for word in difflib.get_close_matches(
+                    term, candidates, SEARCH_TYPO_MATCHES, SEARCH_TYPO_CUTOFF
+                )
+            ]
+        clauses.append("(" + " OR ".join(options) + ")")
+    return " AND ".join(clauses)
+
+
+@cached_query
+@instrumented
+def search_food(text, city=None, limit=20):
+    """
+    Ranked search over live listings by food name, location or provider
+    name / address / city. Optionally restricted to one city.
+    Rows have get_food_by_city() columns; best matches first (bm25),
+    then soonest expiry.
+    """
+    conditions = ["f.quantity > 0", "f.expired_at IS NULL", "f.expiry_date >= ?"]
+    params = [_today()]
+    if city:
+        conditions.append("f.location = ? COLLATE NOCASE")
+        params.append(city)
+    live = " AND ".join(conditions)
+    columns = """f.food_id, f.food_name, f.quantity, f.expiry_date,
+                 f.provider_id, f.location, f.food_type, f.meal_type"""
+
+    with pooled_connection() as conn:
+        match = _fts_query(conn, text)
+        if match is None:
+            return []
+
+        # Best live listings matching on their own text.
+        hits = conn.execute(f"""
+            SELECT {columns}, bm25(food_fts) AS score
+            FROM food_fts
+            JOIN food_listings f ON f.food_id = food_fts.rowid
+            WHERE food_fts MATCH ? AND {live}
+            ORDER BY score, f.expiry_date
+            LIMIT ?
+        """, (match, *params, limit)).fetchall()
+
+        # Listings of matching providers, one bm25 tier at a time (best
+        # first), so a common word never joins every provider's listings:
+        # once `limit` rows are found, later tiers can only rank lower.
+        providers = conn.execute("""
+            SELECT rowid, bm25(provider_fts) AS score
+            FROM provider_fts
+            WHERE provider_fts MATCH ?
+            ORDER BY score
+        """, (match,)).fetchall()
+        found = 0
+        for score, tier in itertools.groupby(providers, key=lambda row: row[1]):
+            if found >= limit:
+                break
+            tier = [row[0] for row in tier]
+            provider = "+f.provider_id" if len(tier) > SEARCH_EXPIRY_WALK_PROVIDERS else "f.provider_id"
+            rows = conn.execute(f"""
+                SELECT {columns}, ?
+                FROM food_listings f
+                WHERE {provider} IN (SELECT value FROM json_each(?))
+                  AND {live}
+                ORDER BY f.expiry_date
+                LIMIT ?
+            """, (score, json.dumps(tier), *params, limit)).fetchall()
+            hits += rows
+            found += len(rows)
+
+    # A listing found both ways keeps its better score.
+    best = {}
+    for row in sorted(hits, key=lambda row: (row[-1], row[3])):
+        best.setdefault(row[0], row[:-1])
+    return list(best.values())[:limit]
 
 
 # =========================================================
 # CLAIMS (FULL DATA IMPACT)
 # =========================================================
 
-def create_claim(food_id, receiver_id):
-    conn = get_connection()
-    cursor = conn.cursor()
+# A claim takes the write lock up front (BEGIN IMMEDIATE), decrements
+# only if enough units remain, and records the claim in the same
+# transaction, so concurrent claimers can never over-allocate a listing.
+# If the lock can't be taken within busy_timeout, the attempt is retried
+# with jittered exponential backoff up to CLAIM_MAX_RETRIES times.
+
+CLAIM_MAX_RETRIES = 6
+CLAIM_BACKOFF_BASE = 0.01
+CLAIM_BACKOFF_MAX = 0.5
+
+CLAIMED = "claimed"
+INSUFFICIENT = "insufficient"
+NOT_FOUND = "not_found"
+INVALID = "invalid"
+EXPIRED = "expired"
+BUSY = "busy"
+ABORTED = "aborted"
+
+
+@dataclass(frozen=True)
+class ClaimResult:
+    ok: bool
+    status: str                 # CLAIMED / INSUFFICIENT / NOT_FOUND / EXPIRED / INVALID / BUSY / ABORTED
+    food_id: int
+    units: int
+    claim_id: int = None
+    remaining: int = None       # units left on the listing after the attempt
+    attempts: int = 1
+    message: str = ""
+
+
+_BUSY_CODES = (5, 6)  # SQLITE_BUSY, SQLITE_LOCKED
+
+
+def _is_busy(error):
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in _BUSY_CODES
+    return "locked" in str(error) or "busy" in str(error)
 
-    cursor.execute("""
-        INSERT INTO claims (food_id, receiver_id, status, timestamp)
-        VALUES (?, ?, 'Completed', ?)
-    """, (food_id, receiver_id, datetime.now()))
 
+def _backoff(attempt):
+    time.sleep(random.uniform(0, min(CLAIM_BACKOFF_MAX, CLAIM_BACKOFF_BASE * 2 ** attempt)))
+
+
+def _claim_units(cursor, food_id, receiver_id, units, timestamp):
+    """
+    Checks and decrements one live listing and records the claim.
+    Must run inside an open write transaction. Returns a ClaimResult.
+    """
+    today = _today()
     cursor.execute("""
         UPDATE food_listings
-        SET quantity = quantity - 1
-        WHERE food_id = ? AND quantity > 0
-    """, (food_id,))
+        SET quantity = quantity - ?
+        WHERE food_id = ? AND quantity >= ?
+          AND expired_at IS NULL AND expiry_date >= ?
+        RETURNING quantity
+    """, (units, food_id, units, today))
+    row = cursor.fetchone()
+
+    if row is None:
+        cursor.execute("""
+            SELECT quantity, expired_at IS NOT NULL OR expiry_date < ?
+            FROM food_listings WHERE food_id = ?
+        """, (today, food_id))
+        found = cursor.fetchone()
+        if found is None:
+            return ClaimResult(False, NOT_FOUND, food_id, units,
+                               message="Food listing not found")
+        if found[1]:
+            return ClaimResult(False, EXPIRED, food_id, units,
+                               message="Food listing has expired")
+        return ClaimResult(False, INSUFFICIENT, food_id, units, remaining=found[0],
+                           message=f"Only {found[0]} unit(s) left")
+
+    cursor.execute("""
+        INSERT INTO claims (food_id, receiver_id, status, timestamp, units)
+        VALUES (?, ?, 'Completed', ?, ?)
+    """, (food_id, receiver_id, timestamp, units))
+
+    return ClaimResult(True, CLAIMED, food_id, units,
+                       claim_id=cursor.lastrowid, remaining=row[0])
+
+
+def run_write_transaction(work, max_retries=None):
+    """
+    Runs work(cursor) inside BEGIN IMMEDIATE on a pooled connection,
+    retrying on SQLITE_BUSY with bounded backoff.
+    work returns (result, commit); the transaction is rolled back when
+    commit is false. Returns (result, attempts), or (None, attempts)
+    if the lock could not be obtained.
+    """
+    max_retries = CLAIM_MAX_RETRIES if max_retries is None else max_retries
+    attempt = 0
+
+    while True:
+        attempt += 1
+        try:
+            with pooled_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                result, commit = work(cursor)
+                if commit:
+                    conn.commit()
+                else:
+                    conn.rollback()
+                return result, attempt
+        except sqlite3.OperationalError as error:
+            if not _is_busy(error):
+                raise
+            if attempt > max_retries:
+                return None, attempt
+            _backoff(attempt)
+
+
+@instrumented
+def claim_food(food_id, receiver_id, units=1, max_retries=None):
+    """
+    Atomically claims `units` units of a listing for a receiver.
+    Never raises for contention; returns a ClaimResult whose status says
+    what happened.
+    """
+    if units < 1:
+        return ClaimResult(False, INVALID, food_id, units,
+                           message="Units must be at least 1")
+
+    timestamp = to_iso_timestamp(datetime.now())
+
+    def work(cursor):
+        result = _claim_units(cursor, food_id, receiver_id, units, timestamp)
+        return result, result.ok
 
-    conn.commit()
-    conn.close()
+    result, attempts = run_write_transaction(work, max_retries)
+    if result is None:
+        return ClaimResult(False, BUSY, food_id, units, attempts=attempts,
+                           message="Database is busy, please try again")
+
+    if result.ok:
+        bump_data_version()
+    return replace(result, attempts=attempts)
+
+
+@instrumented
+def create_claim(food_id, receiver_id, units=1):
+    return claim_food(food_id, receiver_id, units)
+
+
+# =========================================================
+# BATCH CLAIMS
+# =========================================================
+# A shelter's whole pickup run is claimed in one write transaction:
+# every listing is read and validated under the write lock first, then
+# all decrements and claim rows are written with a single commit.
+
+ALL_OR_NOTHING = "all_or_nothing"
+BEST_EFFORT = "best_effort"
+
+
+@dataclass(frozen=True)
+class BatchClaimResult:
+    committed: bool
+    items: list                 # [ClaimResult], same order as the request
+    attempts: int = 1
+
+    @property
+    def ok(self):
+        return self.committed and all(item.ok for item in self.items)
+
+    @property
+    def claimed_units(self):
+        return sum(item.units for item in self.items if item.ok)
+
+
+def _plan_batch(cursor, items):
+    food_ids = sorted({food_id for food_id, _ in items})
+    cursor.execute("""
+        SELECT food_id, quantity, expired_at IS NOT NULL OR expiry_date < ?
+        FROM food_listings
+        WHERE food_id IN (SELECT value FROM json_each(?))
+    """, (_today(), json.dumps(food_ids)))
+    rows = cursor.fetchall()
+    remaining = {food_id: quantity for food_id, quantity, _ in rows}
+    expired = {food_id for food_id, _, is_expired in rows if is_expired}
+
+    planned = []
+    for food_id, units in items:
+        if units < 1:
+            planned.append(ClaimResult(False, INVALID, food_id, units,
+                                       message="Units must be at least 1"))
+        elif food_id not in remaining:
+            planned.append(ClaimResult(False, NOT_FOUND, food_id, units,
+                                       message="Food listing not found"))
+        elif food_id in expired:
+            planned.append(ClaimResult(False, EXPIRED, food_id, units,
+                                       message="Food listing has expired"))
+        elif remaining[food_id] < units:
+            planned.append(ClaimResult(False, INSUFFICIENT, food_id, units,
+                                       remaining=remaining[food_id],
+                                       message=f"Only {remaining[food_id]} unit(s) left"))
+        else:
+            remaining[food_id] -= units
+            planned.append(ClaimResult(True, CLAIMED, food_id, units,
+                                       remaining=remaining[food_id]))
+    return planned
+
+
+@instrumented
+def create_claims_batch(receiver_id, items, mode=ALL_OR_NOTHING, max_retries=None):
+    """
+    Claims many listings for one receiver in a single transaction.
+
+    items: [(food_id, units), ...]
+    mode:  ALL_OR_NOTHING - any failing item rolls back the whole batch
+           BEST_EFFORT    - valid items are claimed, failing ones reported
+    Returns a BatchClaimResult with one ClaimResult per item.
+    """
+    return create_claims_bulk(
+        [(receiver_id, food_id, units) for food_id, units in items],
+        mode, max_retries
+    )
+
+
+@instrumented
+def create_claims_bulk(items, mode=ALL_OR_NOTHING, max_retries=None):
+    """
+    Same as create_claims_batch(), but every item names its receiver:
+    items: [(receiver_id, food_id, units), ...]
+    Used to commit allocations for many receivers in one transaction.
+    """
+    if mode not in (ALL_OR_NOTHING, BEST_EFFORT):
+        raise ValueError(f"Unknown batch claim mode: {mode!r}")
+
+    receivers = [int(receiver_id) for receiver_id, _, _ in items]
+    items = [(int(food_id), int(units)) for _, food_id, units in items]
+    if not items:
+        return BatchClaimResult(True, [])
+
+    timestamp = to_iso_timestamp(datetime.now())
+
+    def work(cursor):
+        planned = _plan_batch(cursor, items)
+        failed = any(not item.ok for item in planned)
+
+        if mode == ALL_OR_NOTHING and failed:
+            return [
+                item if not item.ok else replace(
+                    item, ok=False, status=ABORTED, remaining=None,
+                    message="Batch rolled back: another item failed"
+                )
+                for item in planned
+            ], False
+
+        decrements = {}
+        for item in planned:
+            if item.ok:
+                decrements[item.food_id] = decrements.get(item.food_id, 0) + item.units
+        cursor.executemany("""
+            UPDATE food_listings
+            SET quantity = quantity - ?
+            WHERE food_id = ?
+        """, [(units, food_id) for food_id, units in decrements.items()])
+
+        results = []
+        for receiver_id, item in zip(receivers, planned):
+            if item.ok:
+                cursor.execute("""
+                    INSERT INTO claims (food_id, receiver_id, status, timestamp, units)
+                    VALUES (?, ?, 'Completed', ?, ?)
+                """, (item.food_id, receiver_id, timestamp, item.units))
+                item = replace(item, claim_id=cursor.lastrowid)
+            results.append(item)
+        return results, bool(decrements)
+
+    results, attempts = run_write_transaction(work, max_retries)
+    if results is None:
+        return BatchClaimResult(False, [
+            ClaimResult(False, BUSY, food_id, units, attempts=attempts,
+                        message="Database is busy, please try again")
+            for food_id, units in items
+        ], attempts)
+
+    committed = any(item.ok for item in results)
+    if committed:
+        bump_data_version()
+    return BatchClaimResult(
+        committed,
+        [replace(item, attempts=attempts) for item in results],
+        attempts
+    )
 
 
 # =========================================================
 # HOME PAGE ANALYTICS
 # =========================================================
 
+@cached_query
+@instrumented
 def total_food_available():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COALESCE(SUM(quantity), 0) FROM food_listings")
-    total = cursor.fetchone()[0]
-    conn.close()
-    return total
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(SUM(total_quantity), 0) FROM summary_city")
+        return cursor.fetchone()[0]
 
 
+@cached_query
+@instrumented
 def most_common_food_types():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT food_type, COUNT(*)
-        FROM food_listings
-        GROUP BY food_type
-        ORDER BY COUNT(*) DESC
-    """)
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT food_type, listing_count
+            FROM summary_food_type
+            WHERE listing_count > 0
+            ORDER BY listing_count DESC
+        """)
+        return cursor.fetchall()
 
 
+@cached_query
+@instrumented
 def claim_status_percentage():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT status,
-               COUNT(*) * 100.0 / (SELECT COUNT(*) FROM claims)
-        FROM claims
-        GROUP BY status
-    """)
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT status,
+                   claim_count * 100.0 / (
+                       SELECT SUM(claim_count) FROM summary_claim_status
+                   )
+            FROM summary_claim_status
+            WHERE claim_count > 0
+        """)
+        return cursor.fetchall()
+
+
+@dataclass(frozen=True)
+class DashboardSnapshot:
+    """
+    Everything the Home page renders, read from one consistent snapshot.
+    """
+    total_food: int = 0
+    food_types: list = field(default_factory=list)          # [(food_type, count)]
+    claim_status: list = field(default_factory=list)        # [(status, percentage)]
+    top_receivers: list = field(default_factory=list)       # [(name, claims)]
+    claims_over_time: list = field(default_factory=list)    # [(date, claims)]
+
+
+@cached_query
+@instrumented
+def dashboard_snapshot(top_receivers_limit=5):
+    """
+    Computes all Home page metrics on one connection inside a single
+    read transaction, so every figure reflects the same data.
+    Status percentages and the claims trend come from one pass over the
+    claim summaries instead of separate queries.
+    """
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute("""
+                SELECT COALESCE(SUM(total_quantity), 0) FROM summary_city
+            """)
+            total_food = cursor.fetchone()[0]
+
+            cursor.execute("""
+                SELECT food_type, listing_count
+                FROM summary_food_type
+                WHERE listing_count > 0
+                ORDER BY listing_count DESC
+            """)
+            food_types = cursor.fetchall()
+
+            cursor.execute("""
+                SELECT 'status', status, claim_count
+                FROM summary_claim_status
+                WHERE claim_count > 0
+                UNION ALL
+                SELECT 'day', NULLIF(day, ''), claim_count
+                FROM summary_claims_daily
+                WHERE claim_count > 0
+            """)
+            status_counts, daily = [], []
+            for kind, key, count in cursor.fetchall():
+                (status_counts if kind == "status" else daily).append((key, count))
+
+            cursor.execute("""
+                SELECT r.name, c.total_claims
+                FROM (
+                    SELECT receiver_id, COUNT(*) AS total_claims
+                    FROM claims
+                    GROUP BY receiver_id
+                ) c
+                JOIN receivers r ON c.receiver_id = r.receiver_id
+                ORDER BY c.total_claims DESC
+                LIMIT ?
+            """, (top_receivers_limit,))
+            top_receivers = cursor.fetchall()
+        finally:
+            conn.commit()
+
+    total_claims = sum(count for _, count in status_counts)
+    daily.sort(key=lambda row: (row[0] is not None, row[0] or ""))
+
+    return DashboardSnapshot(
+        total_food=total_food,
+        food_types=food_types,
+        claim_status=[
+            (status, count * 100.0 / total_claims)
+            for status, count in status_counts
+        ],
+        top_receivers=top_receivers,
+        claims_over_time=daily,
+    )
 
 
 # =========================================================
 # EDA / RANKINGS / TRENDS
 # =========================================================
+# Served from the read-only analytics snapshot (src/analytics.py) when
+# one is fresh enough, so these aggregations never run on the live file.
 
+@cached_query
+@instrumented
 def top_receivers_by_claims(limit=5):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT r.name, COUNT(c.claim_id) AS total_claims
-        FROM claims c
-        JOIN receivers r ON c.receiver_id = r.receiver_id
-        GROUP BY r.receiver_id
-        ORDER BY total_claims DESC
-        LIMIT ?
-    """, (limit,))
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    with analytics_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT r.name, c.total_claims
+            FROM (
+                SELECT receiver_id, COUNT(*) AS total_claims
+                FROM claims
+                GROUP BY receiver_id
+            ) c
+            JOIN receivers r ON c.receiver_id = r.receiver_id
+            ORDER BY c.total_claims DESC
+            LIMIT ?
+        """, (limit,))
+        return cursor.fetchall()
 
 
+@cached_query
+@instrumented
 def top_providers_by_donation(limit=5):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT provider_id, SUM(quantity) AS total_donated
-        FROM food_listings
-        GROUP BY provider_id
-        ORDER BY total_donated DESC
-        LIMIT ?
-    """, (limit,))
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    with analytics_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT provider_id, SUM(quantity) AS total_donated
+            FROM food_listings
+            GROUP BY provider_id
+            ORDER BY total_donated DESC
+            LIMIT ?
+        """, (limit,))
+        return cursor.fetchall()
 
 
+@cached_query
+@instrumented
 def food_by_city():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT location, SUM(quantity)
-        FROM food_listings
-        GROUP BY location
-        ORDER BY SUM(quantity) DESC
-    """)
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    with analytics_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT location, total_quantity
+            FROM summary_city
+            WHERE listing_count > 0
+            ORDER BY total_quantity DESC
+        """)
+        return cursor.fetchall()
 
 
+@cached_query
+@instrumented
 def claims_over_time():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DATE(timestamp) AS date, COUNT(*) AS total_claims
-        FROM claims
-        GROUP BY DATE(timestamp)
-        ORDER BY DATE(timestamp)
-    """)
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    with analytics_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT NULLIF(day, '') AS date, claim_count AS total_claims
+            FROM summary_claims_daily
+            WHERE claim_count > 0
+            ORDER BY day
+        """)
+        return cursor.fetchall()
+
+
+# =========================================================
+# TIME-SERIES TRENDS
+# =========================================================
+# Trend charts read the hour/day/week/month rollups (see
+# refresh_timeseries() in src/db.py) at the finest resolution that keeps
+# the requested range within the point budget, so a chart costs about
+# max_points rows however long the history is. New rows are folded in
+# by refresh_trends(), run from the background sweeper (src/expiry.py),
+# so rendering a chart never takes the write lock.
+
+TREND_MAX_POINTS = 120
+
+RESOLUTION_SECONDS = {
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 30.44 * 86400,
+}
+
+
+@dataclass(frozen=True)
+class TimeSeries:
+    resolution: str         # hour | day | week | month
+    points: list            # [(bucket, value, ...)] in bucket order
+
+
+def refresh_trends():
+    """
+    Folds rows written since the last call into the rollups and, if any
+    were added, invalidates cached query results so charts pick them up.
+    Returns the number of rows folded in (None if the database stayed
+    busy; the next call catches up).
+    """
+    folded, _ = run_write_transaction(lambda cursor: (refresh_timeseries(cursor), True))
+    if folded:
+        bump_data_version()
+    return folded
+
+
+def pick_resolution(start, end, max_points=None):
+    """
+    Finest resolution whose bucket count over [start, end] fits max_points.
+    """
+    max_points = max_points or TREND_MAX_POINTS
+    span = max(0.0, (end - start).total_seconds())
+    for resolution, seconds in RESOLUTION_SECONDS.items():
+        if span / seconds + 1 <= max_points:
+            return resolution
+    return "month"
+
+
+def _series_range(conn, table, start, end):
+    end = datetime.strptime(to_iso_timestamp(end or datetime.now()), TIMESTAMP_FORMAT)
+    if start is not None:
+        return datetime.strptime(to_iso_timestamp(start), TIMESTAMP_FORMAT), end
+    first = conn.execute(
+        f"SELECT MIN(bucket) FROM {table} WHERE resolution = 'hour'"
+    ).fetchone()[0]
+    return (datetime.strptime(first, "%Y-%m-%d %H:%M") if first else end), end
+
+
+def _series(table, columns, start, end, max_points, where="", params=()):
+    with pooled_connection() as conn:
+        start, end = _series_range(conn, table, start, end)
+        resolution = pick_resolution(start, end, max_points)
+        bucket = TIMESERIES_BUCKETS[resolution]
+        rows = conn.execute(f"""
+            SELECT bucket, {columns}
+            FROM {table}
+            WHERE resolution = ?
+              AND bucket >= {bucket.format(ts="?")}
+              AND bucket <= ?
+              {where}
+            GROUP BY bucket
+            ORDER BY bucket
+        """, (
+            resolution,
+            start.strftime(TIMESTAMP_FORMAT),
+            end.strftime(TIMESTAMP_FORMAT),
+            *params,
+        )).fetchall()
+    return TimeSeries(resolution, rows)
+
+
+@cached_query
+@instrumented
+def claims_timeseries(start=None, end=None, max_points=None, status=None):
+    """
+    Claims per bucket between start and end (default: all history up to
+    now), optionally for one status. Returns a TimeSeries of
+    [(bucket, claims)].
+    """
+    return _series(
+        "timeseries_claims", "SUM(claim_count)", start, end, max_points,
+        *(("AND status = ?", (status,)) if status else ())
+    )
+
+
+@cached_query
+@instrumented
+def listings_timeseries(start=None, end=None, max_points=None):
+    """
+    Listing quantity posted and expired per bucket. Returns a TimeSeries
+    of [(bucket, quantity_posted, quantity_expired)].
+    """
+    return _series(
+        "timeseries_listings", "SUM(quantity_posted), SUM(quantity_expired)",
+        start, end, max_points
+    )
+
+
+# =========================================================
+# QUERY PLAN CHECK
+# =========================================================
+
+def _read_query_calls():
+    return [
+        (authenticate_user, ("", "")),
+        (get_receiver_by_user, (0,)),
+        (get_food_by_city, ("",)),
+        (get_available_food, ()),
+        (get_food_by_city_page, ("", ("", 0))),
+        (get_available_food_page, (("", 0),)),
+        (get_food_near, ("",)),
+        (search_food, ("bread",)),
+        (total_food_available, ()),
+        (most_common_food_types, ()),
+        (claim_status_percentage, ()),
+        (top_receivers_by_claims, ()),
+        (top_providers_by_donation, ()),
+        (food_by_city, ()),
+        (claims_over_time, ()),
+        (claims_timeseries, ()),
+        (listings_timeseries, ()),
+        (dashboard_snapshot, ()),
+    ]
+
+
+def check_query_plans():
+    """
+    Runs every read query, captures the SQL it actually executes and
+    returns {function_name: [plan lines]} for any statement whose
+    EXPLAIN QUERY PLAN contains a full table scan. Empty dict = all
+    queries are served by an index.
+    """
+    failures = {}
+
+    for func, args in _read_query_calls():
+        statements = []
+        pools = [get_pool(), get_analytics_pool()]
+        pools = [pool for pool in pools if pool is not None]
+        for pool in pools:
+            pool.set_trace_callback(statements.append)
+        try:
+            getattr(func, "__wrapped__", func)(*args)
+        finally:
+            for pool in pools:
+                pool.set_trace_callback(None)
+
+        with pooled_connection() as conn:
+            for sql in statements:
+                if not sql.lstrip().upper().startswith("SELECT"):
+                    continue
+                plan = explain_query_plan(conn, sql)
+                if full_table_scans(plan, allowed=SUMMARY_TABLES):
+                    failures.setdefault(func.__name__, []).extend(plan)
+
+    return failures
@@ -0,0 +1,34 @@
+"""
+sweep_expired.py
+-----------------
+Retires expired food listings so discovery only scans live inventory.
+
+    python sweep_expired.py                 # one sweep
+    python sweep_expired.py --loop 300      # sweep every 300 seconds
+"""
+
+import argparse
+import time
+
+from src.db import initialize_database
+from src.expiry import sweep_expired, SWEEP_BATCH_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag expired food listings")
+    parser.add_argument("--batch-size", type=int, default=SWEEP_BATCH_SIZE)
+    parser.add_argument("--loop", type=float, metavar="SECONDS",
+                        help="keep sweeping at this interval")
+    args = parser.parse_args()
+
+    initialize_database()
+    while True:
+        flagged = sweep_expired(args.batch_size)
+        print(f"🧹 Flagged {flagged} expired listing(s)")
+        if not args.loop:
+            break
+        time.sleep(args.loop)
+
+
+if __name__ == "__main__":
+    main()